@@ -1,12 +1,20 @@
 {
     'name': 'CRM to Sale Propagate',
-    'version': '19.0.1.0.0',
+    'version': '19.0.1.2.0',
     'category': 'Sales/CRM',
     'summary': 'Propaga campos y líneas de residuos de CRM a cotizaciones',
     'author': 'Alphaqueb Consulting',
-    'depends': ['crm_custom_fields', 'sale'],
+    'depends': ['crm_custom_fields', 'sale_crm', 'sale_stock'],
     'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron.xml',
+        'data/crm_lead_actions.xml',
+        'views/sale_residue_add_wizard_views.xml',
+        'views/sale_residue_import_wizard_views.xml',
         'views/sale_order_view.xml',
+        'views/sale_crm_propagate_stat_views.xml',
+        'views/sale_residue_report_views.xml',
+        'views/sale_collection_event_views.xml',
         'reports/sale_order_report_template.xml',
     ],
     'installable': True,
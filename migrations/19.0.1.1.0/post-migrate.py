@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Mueve los bloques de texto del prospecto (antes columnas de sale_order)
+a sale.prospect.profile: un perfil por combinación (lead, contenido),
+compartido por todas las cotizaciones que tenían los mismos valores.
+"""
+from collections import defaultdict
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+from odoo.addons.sale_crm_propagate.models.sale_prospect_profile import PROSPECT_PROFILE_FIELDS
+
+
+def migrate(cr, version):
+    if not version:
+        return
+
+    columns = [fname for fname in PROSPECT_PROFILE_FIELDS if column_exists(cr, 'sale_order', fname)]
+    if not columns:
+        return
+
+    lead_column = 'opportunity_id' if column_exists(cr, 'sale_order', 'opportunity_id') else 'NULL'
+    cr.execute(
+        "SELECT id, %s, partner_id, %s FROM sale_order WHERE prospect_profile_id IS NULL AND (%s)" % (
+            lead_column,
+            ', '.join(columns),
+            ' OR '.join('%s IS NOT NULL' % col for col in columns),
+        )
+    )
+
+    order_ids_by_key = defaultdict(list)
+    for row in cr.fetchall():
+        order_id, lead_id, partner_id, values = row[0], row[1], row[2], tuple(row[3:])
+        order_ids_by_key[(lead_id, partner_id, values)].append(order_id)
+
+    if order_ids_by_key:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        keys = list(order_ids_by_key)
+        profiles = env['sale.prospect.profile'].create([
+            dict(zip(columns, values), partner_id=partner_id)
+            for _lead_id, partner_id, values in keys
+        ])
+        for key, profile in zip(keys, profiles):
+            cr.execute(
+                "UPDATE sale_order SET prospect_profile_id = %s WHERE id IN %s",
+                (profile.id, tuple(order_ids_by_key[key])),
+            )
+
+    # Las columnas ya no pertenecen a sale_order
+    for col in columns:
+        cr.execute('ALTER TABLE sale_order DROP COLUMN IF EXISTS "%s"' % col)
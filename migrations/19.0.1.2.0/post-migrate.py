@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Antes de esta versión no se distinguía "editado por el usuario" de "vino del
+CRM" (ambos activaban *_manual). Para no pisar ediciones previas, en las
+cotizaciones abiertas se marca *_user_set cuando el valor difiere del lead.
+"""
+from odoo.tools.sql import column_exists
+
+_USER_SET_COLUMNS = {
+    'pickup_location_id': 'pickup_location_user_set',
+    'final_destination_id': 'final_destination_user_set',
+}
+
+
+def migrate(cr, version):
+    if not version or not column_exists(cr, 'sale_order', 'opportunity_id'):
+        return
+
+    for fname, flag in _USER_SET_COLUMNS.items():
+        if not column_exists(cr, 'crm_lead', fname):
+            continue
+        cr.execute(
+            """
+            UPDATE sale_order so
+               SET %(flag)s = TRUE
+              FROM crm_lead lead
+             WHERE lead.id = so.opportunity_id
+               AND so.state IN ('draft', 'sent')
+               AND so.%(field)s IS NOT NULL
+               AND so.%(field)s IS DISTINCT FROM lead.%(field)s
+            """ % {'flag': flag, 'field': fname}
+        )
@@ -1,2 +1,10 @@
+from . import uom_uom
+from . import product_template
+from . import sale_prospect_profile
+from . import sale_crm_propagate_stat
 from . import sale_order
 from . import sale_order_line
+from . import sale_collection_event
+from . import crm_lead
+# Después de sale_order_line: la vista materializada usa sus columnas
+from . import sale_residue_report
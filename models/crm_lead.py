@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, _
+
+_logger = logging.getLogger(__name__)
+
+
+class CrmLead(models.Model):
+    _inherit = 'crm.lead'
+
+    # Oportunidades por lote (un create de sale.order por lote)
+    _QUOTATION_BATCH_SIZE = 200
+
+    def _prepare_bulk_quotation_vals(self):
+        """Valores mínimos de la cotización; el resto llega por la propagación CRM."""
+        self.ensure_one()
+        return {
+            'partner_id': self.partner_id.id,
+            'opportunity_id': self.id,
+            'team_id': self.team_id.id,
+            'user_id': self.user_id.id or self.env.uid,
+            'company_id': self.company_id.id or self.env.company.id,
+            'origin': self.name,
+        }
+
+    def _get_bulk_quotation_candidates(self):
+        """Leads con cliente y sin cotizaciones vigentes (re-ejecutar no duplica)."""
+        return self.filtered(
+            lambda lead: lead.partner_id and not lead.order_ids.filtered(lambda o: o.state != 'cancel')
+        )
+
+    def _create_quotations_in_batches(self, batch_size=None, auto_commit=False):
+        """
+        Crea las cotizaciones de los leads por lotes: un create() de sale.order
+        por lote (reutiliza la propagación de SaleOrder.create) y, si auto_commit,
+        un commit al terminar cada lote. Devuelve (órdenes, leads omitidos).
+        """
+        batch_size = batch_size or self._QUOTATION_BATCH_SIZE
+        leads = self._get_bulk_quotation_candidates()
+        skipped = self - leads
+
+        SaleOrder = self.env['sale.order']
+        order_ids = []
+        total = len(leads)
+        for start in range(0, total, batch_size):
+            chunk = leads[start:start + batch_size]
+            orders = SaleOrder.create([lead._prepare_bulk_quotation_vals() for lead in chunk])
+            order_ids.extend(orders.ids)
+            _logger.info("Conversión masiva CRM: %s/%s oportunidades", start + len(chunk), total)
+            if auto_commit:
+                self.env.cr.commit()
+        return SaleOrder.browse(order_ids), skipped
+
+    def action_create_quotations_bulk(self):
+        """Acción de servidor: convierte las oportunidades seleccionadas en cotizaciones."""
+        auto_commit = len(self) > self._QUOTATION_BATCH_SIZE and not self.env.registry.in_test_mode()
+        orders, skipped = self._create_quotations_in_batches(auto_commit=auto_commit)
+        message = _('%(count)s cotización(es) creada(s).', count=len(orders))
+        if skipped:
+            message += ' ' + _('%(count)s oportunidad(es) omitida(s) (sin cliente o con cotización).', count=len(skipped))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Conversión masiva'),
+                'message': message,
+                'type': 'success' if orders else 'warning',
+                'next': {
+                    'type': 'ir.actions.act_window',
+                    'name': _('Cotizaciones creadas'),
+                    'res_model': 'sale.order',
+                    'view_mode': 'list,form',
+                    'views': [(False, 'list'), (False, 'form')],
+                    'domain': [('id', 'in', orders.ids)],
+                },
+            },
+        }
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación de los puntos calientes de la propagación CRM -> venta.
+
+Las métricas se acumulan por transacción (una petición) en los datos del
+postcommit del cursor y se emiten en un único registro de log estructurado
+(JSON) después del commit. No se usa el precommit: corre en cada savepoint
+con flush, lo que partiría la petición en varios registros. Si el parámetro
+`sale_crm_propagate.stats_enabled` está activo, además se agregan por día en
+sale.crm.propagate.stat (con un cursor propio, la transacción ya terminó).
+Si no está activo ni el log DEBUG, no se emite nada. Si la transacción se
+revierte, sus métricas se descartan.
+"""
+import functools
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+STATS_KEY = 'sale_crm_propagate.stats'
+STATS_ENABLED_PARAM = 'sale_crm_propagate.stats_enabled'
+COUNTERS = ('calls', 'seconds', 'queries', 'created', 'cache_hits', 'cache_misses')
+
+
+def _new_counters():
+    return dict.fromkeys(COUNTERS, 0)
+
+
+def get_request_stats(env):
+    """Acumulador de la transacción actual: {operación: contadores}."""
+    data = env.cr.postcommit.data
+    stats = data.get(STATS_KEY)
+    if stats is None:
+        stats = data[STATS_KEY] = defaultdict(_new_counters)
+        # El parámetro se lee aquí (get_param está en caché), no después del
+        # commit: sin estadísticas ni log DEBUG no se registra el hook, y así
+        # no se abre un cursor ni se serializa nada en cada transacción.
+        enabled = bool(env['ir.config_parameter'].sudo().get_param(STATS_ENABLED_PARAM))
+        if enabled or _logger.isEnabledFor(logging.DEBUG):
+            env.cr.postcommit.add(functools.partial(_flush_request_stats, env, stats, enabled))
+    return stats
+
+
+def count(env, operation, **counters):
+    """Suma contadores sueltos (p.ej. cache_hits=1) a una operación."""
+    record = get_request_stats(env)[operation]
+    for name, value in counters.items():
+        record[name] += value
+
+
+@contextmanager
+def measure(env, operation):
+    """
+    Mide tiempo de pared y consultas SQL del bloque. El bloque puede sumar
+    registros creados en la métrica devuelta: ``metric['created'] += n``.
+    """
+    cr = env.cr
+    metric = {'created': 0}
+    start_queries = getattr(cr, 'sql_log_count', 0)
+    start = time.perf_counter()
+    try:
+        yield metric
+    finally:
+        # Medir antes de get_request_stats: su lectura del parámetro no cuenta
+        seconds = time.perf_counter() - start
+        queries = getattr(cr, 'sql_log_count', 0) - start_queries
+        record = get_request_stats(env)[operation]
+        record['calls'] += 1
+        record['seconds'] += seconds
+        record['queries'] += queries
+        record['created'] += metric['created']
+
+
+def _flush_request_stats(env, stats, enabled):
+    if not stats:
+        return
+
+    payload = {
+        operation: {name: round(value, 6) if name == 'seconds' else value for name, value in record.items()}
+        for operation, record in stats.items()
+    }
+    log = _logger.info if enabled else _logger.debug
+    log("sale_crm_propagate stats %s", json.dumps(payload, sort_keys=True))
+    if not enabled:
+        return
+
+    with env.registry.cursor() as cr:
+        env(cr=cr)['sale.crm.propagate.stat']._upsert_request_stats(payload)
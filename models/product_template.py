@@ -0,0 +1,35 @@
+import re
+import unicodedata
+
+from odoo import models, fields, api
+
+
+def normalize_residue_name(name):
+    """Clave normalizada de un residuo: minúsculas, sin acentos y sin espacios sobrantes."""
+    if not name:
+        return False
+    folded = unicodedata.normalize('NFKD', name)
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', folded).strip().lower() or False
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    residue_service_key = fields.Char(
+        string='Clave de Residuo',
+        compute='_compute_residue_service_key',
+        store=True,
+        index=True,
+        copy=False,
+        help='Nombre normalizado del servicio de residuo, usado para evitar productos duplicados.'
+    )
+
+    @api.depends('name', 'type')
+    def _compute_residue_service_key(self):
+        for template in self:
+            if template.type != 'service':
+                template.residue_service_key = False
+                continue
+            # Valor fuente (en_US) para que la clave no dependa del idioma del usuario
+            template.residue_service_key = normalize_residue_name(template.with_context(lang='en_US').name)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time
+
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY, YEARLY
+
+from odoo import models, fields, api
+
+# service_frequency -> (frecuencia rrule, intervalo). 'unica' genera un solo evento.
+COLLECTION_FREQUENCY_RULES = {
+    'diaria': (DAILY, 1),
+    'semanal': (WEEKLY, 1),
+    'quincenal': (WEEKLY, 2),
+    'mensual': (MONTHLY, 1),
+    'bimestral': (MONTHLY, 2),
+    'trimestral': (MONTHLY, 3),
+    'semestral': (MONTHLY, 6),
+    'anual': (YEARLY, 1),
+}
+SINGLE_COLLECTION_FREQUENCY = 'unica'
+
+
+def collection_dates(frequency, anchor, after, until):
+    """
+    Fechas de recolección de la serie que inicia en `anchor`, estrictamente
+    posteriores a `after` (si se da) y hasta `until` inclusive. La serie
+    conserva la fase de `anchor`: extender el horizonte no la desplaza.
+    """
+    if frequency == SINGLE_COLLECTION_FREQUENCY:
+        return [anchor] if not after and anchor <= until else []
+    rule = COLLECTION_FREQUENCY_RULES.get(frequency)
+    if not rule or until < anchor:
+        return []
+    freq, interval = rule
+    options = {}
+    if freq in (MONTHLY, YEARLY) and anchor.day > 28:
+        # Día 29-31: último día del mes en los meses más cortos
+        options = {'bymonthday': (anchor.day, -1), 'bysetpos': 1}
+        if freq == YEARLY:
+            options['bymonth'] = anchor.month
+    dates = rrule(
+        freq,
+        interval=interval,
+        dtstart=datetime.combine(anchor, time.min),
+        until=datetime.combine(until, time.min),
+        **options,
+    )
+    return [dt.date() for dt in dates if not after or dt.date() > after]
+
+
+class SaleCollectionEvent(models.Model):
+    _name = 'sale.collection.event'
+    _description = 'Evento de Recolección'
+    _order = 'scheduled_date, id'
+
+    order_id = fields.Many2one('sale.order', string='Orden', required=True, ondelete='cascade', index=True)
+    partner_id = fields.Many2one(related='order_id.partner_id', string='Cliente', store=True)
+    company_id = fields.Many2one(related='order_id.company_id', string='Compañía', store=True)
+    pickup_location_id = fields.Many2one(related='order_id.pickup_location_id', string='Ubicación de Recolección')
+    scheduled_date = fields.Date(string='Fecha Programada', required=True, index=True)
+    allowed_collection_schedules = fields.Text(related='order_id.allowed_collection_schedules', string='Horarios Permitidos')
+    state = fields.Selection([
+        ('planned', 'Programada'),
+        ('done', 'Realizada'),
+        ('cancel', 'Cancelada'),
+    ], string='Estado', default='planned', required=True, index=True)
+
+    _order_date_uniq = models.UniqueIndex(
+        "(order_id, scheduled_date) WHERE state != 'cancel'",
+        'Solo puede haber una recolección activa por orden y fecha.',
+    )
+
+    @api.depends('order_id.name', 'scheduled_date')
+    def _compute_display_name(self):
+        for event in self:
+            event.display_name = f'{event.order_id.name} - {event.scheduled_date}'
+
+    def action_done(self):
+        self.filtered(lambda e: e.state == 'planned').write({'state': 'done'})
+
+    def action_cancel(self):
+        self.filtered(lambda e: e.state == 'planned').write({'state': 'cancel'})
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+from .instrumentation import COUNTERS
+
+
+class SaleCrmPropagateStat(models.Model):
+    _name = 'sale.crm.propagate.stat'
+    _description = 'Estadísticas de Propagación CRM'
+    _order = 'date desc, operation'
+
+    date = fields.Date(string='Fecha', required=True, readonly=True)
+    operation = fields.Char(string='Operación', required=True, readonly=True)
+    calls = fields.Integer(string='Llamadas', readonly=True, aggregator='sum')
+    seconds = fields.Float(string='Tiempo (s)', readonly=True, aggregator='sum')
+    queries = fields.Integer(string='Consultas SQL', readonly=True, aggregator='sum')
+    created = fields.Integer(string='Registros creados', readonly=True, aggregator='sum')
+    cache_hits = fields.Integer(string='Aciertos de cache', readonly=True, aggregator='sum')
+    cache_misses = fields.Integer(string='Fallos de cache', readonly=True, aggregator='sum')
+
+    _date_operation_uniq = models.Constraint(
+        'UNIQUE(date, operation)',
+        'Solo puede existir una fila por fecha y operación.',
+    )
+
+    @api.model
+    def _upsert_request_stats(self, payload):
+        """
+        Agrega las métricas de una petición en la fila del día (SQL directo:
+        se llama desde el postcommit, con un cursor propio y sin flush del ORM).
+        """
+        today = fields.Date.context_today(self)
+        uid = self.env.uid
+        for operation, record in payload.items():
+            self.env.cr.execute(
+                """
+                INSERT INTO sale_crm_propagate_stat
+                    (date, operation, %(columns)s, create_uid, create_date, write_uid, write_date)
+                VALUES (%%s, %%s, %(placeholders)s, %%s, now() at time zone 'UTC', %%s, now() at time zone 'UTC')
+                ON CONFLICT (date, operation) DO UPDATE SET
+                    %(updates)s,
+                    write_uid = EXCLUDED.write_uid,
+                    write_date = EXCLUDED.write_date
+                """ % {
+                    'columns': ', '.join(COUNTERS),
+                    'placeholders': ', '.join(['%s'] * len(COUNTERS)),
+                    'updates': ', '.join(
+                        '%s = sale_crm_propagate_stat.%s + EXCLUDED.%s' % (name, name, name) for name in COUNTERS
+                    ),
+                },
+                [today, operation] + [record[name] for name in COUNTERS] + [uid, uid],
+            )
@@ -1,10 +1,26 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
-from datetime import date
+import hashlib
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+
+from . import instrumentation
+from .product_template import normalize_residue_name
+from .sale_collection_event import collection_dates
+from .sale_prospect_profile import PROSPECT_PROFILE_FIELDS
+
+_logger = logging.getLogger(__name__)
 
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
+    # Árbol de cotizaciones derivadas (related_quotation_id) con parent_path
+    _parent_name = 'related_quotation_id'
+    _parent_store = True
 
     # -------------------------------------------------------------------------
     # CAMPOS (CRM -> SALE)
@@ -35,8 +51,18 @@ class SaleOrder(models.Model):
                     return []
         return sel or []
 
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_cached_service_frequency_selection(self):
+        """
+        Selection resuelto una vez por registry (y por idioma): fields_get, vistas,
+        exportaciones y reportes no repiten la introspección de crm.lead.
+        El cache se limpia al recargar el registry (actualización de módulos).
+        """
+        return tuple(tuple(item) for item in self._get_service_frequency_selection())
+
     service_frequency = fields.Selection(
-        selection=lambda self: self._get_service_frequency_selection(),
+        selection=lambda self: list(self._get_cached_service_frequency_selection()),
         string='Frecuencia del Servicio'
     )
 
@@ -59,6 +85,9 @@ class SaleOrder(models.Model):
         help='Si está activo, no se sobrescribe automáticamente con la dirección del cliente.'
     )
 
+    # Editado por el usuario (no por CRM ni autofill): la sincronización CRM no lo reemplaza
+    pickup_location_user_set = fields.Boolean(string='Ubicación de recolección (editada)', default=False, copy=False)
+
     # CAMBIO: Destino final ahora solo selección (Many2one), ya no texto
     final_destination_id = fields.Many2one(
         'res.partner',
@@ -72,6 +101,21 @@ class SaleOrder(models.Model):
         copy=False,
         help='Si está activo, no se sobrescribe automáticamente con el valor del CRM.'
     )
+    final_destination_user_set = fields.Boolean(string='Destino final (editado)', default=False, copy=False)
+
+    # Direcciones en una línea (listas, búsqueda, exportaciones y reporte)
+    pickup_location_address = fields.Char(
+        string='Dirección de recolección',
+        compute='_compute_partner_addresses',
+        store=True,
+        index='trigram'
+    )
+    final_destination_address = fields.Char(
+        string='Dirección de destino final',
+        compute='_compute_partner_addresses',
+        store=True,
+        index='trigram'
+    )
 
     expiration_date = fields.Date(
         string='Fecha de Expiración',
@@ -94,7 +138,8 @@ class SaleOrder(models.Model):
         'sale.order',
         string='Cotización Relacionada',
         help='Referencia a una cotización anterior para el mismo cliente. Útil cuando se agregan nuevos tipos de residuos.',
-        domain="[('partner_id', '=', partner_id), ('id', '!=', id)]"
+        domain="[('partner_id', '=', partner_id), ('id', '!=', id)]",
+        index='btree_not_null'
     )
 
     child_quotations_ids = fields.One2many(
@@ -104,9 +149,48 @@ class SaleOrder(models.Model):
         help='Cotizaciones posteriores que referencian a esta cotización'
     )
 
+    parent_path = fields.Char(index=True)
+
     child_quotations_count = fields.Integer(
         string='Cotizaciones Derivadas',
-        compute='_compute_child_quotations_count'
+        compute='_compute_child_quotations_count',
+        store=True
+    )
+
+    # Idempotencia de create(): el formulario lo envía con la orden nueva y un
+    # reintento del mismo RPC (balanceador, integraciones) trae el mismo token
+    create_request_token = fields.Char(
+        string='Token de creación',
+        copy=False,
+        help='Identificador de la petición de creación; repetir create() con el mismo token devuelve la orden existente.'
+    )
+
+    _create_request_token_uniq = models.Constraint(
+        'UNIQUE(create_request_token)',
+        'Ya existe una orden creada con este token de creación.',
+    )
+
+    # RECOLECCIONES PROGRAMADAS (órdenes confirmadas)
+    collection_event_ids = fields.One2many('sale.collection.event', 'order_id', string='Recolecciones')
+    collection_event_count = fields.Integer(string='Recolecciones', compute='_compute_collection_event_count')
+    collection_horizon_date = fields.Date(
+        string='Recolecciones Generadas Hasta',
+        copy=False,
+        readonly=True,
+        help='Fecha hasta la que ya se generaron las recolecciones; el cron solo extiende desde aquí.'
+    )
+
+    # RESUMEN DE RESIDUOS (almacenado; se recalcula solo si cambian las medidas de las líneas)
+    residue_total_weight_kg = fields.Float(string='Peso Total de Residuos (kg)', compute='_compute_residue_summary', store=True)
+    residue_total_volume = fields.Float(string='Unidades Totales de Residuos', compute='_compute_residue_summary', store=True)
+    residue_weight_rsu_kg = fields.Float(string='Peso RSU (kg)', compute='_compute_residue_summary', store=True)
+    residue_weight_rme_kg = fields.Float(string='Peso RME (kg)', compute='_compute_residue_summary', store=True)
+    residue_weight_rp_kg = fields.Float(string='Peso RP (kg)', compute='_compute_residue_summary', store=True)
+    residue_weight_by_plan = fields.Json(
+        string='Peso por Plan de Manejo (kg)',
+        compute='_compute_residue_summary',
+        store=True,
+        help='{plan_manejo: kg} de las líneas de la orden.'
     )
 
     # INFORMACIÓN BÁSICA DEL PROSPECTO
@@ -128,18 +212,27 @@ class SaleOrder(models.Model):
 
     estimated_business_potential = fields.Float(string="Potencial Estimado de Negocio")
 
+    # PERFIL DEL PROSPECTO: los bloques de texto viven en sale.prospect.profile,
+    # compartido por referencia (uno por lead) y copiado al editarse en una cotización.
+    prospect_profile_id = fields.Many2one(
+        'sale.prospect.profile',
+        string='Perfil del Prospecto',
+        ondelete='set null',
+        index='btree_not_null'
+    )
+
     # INFORMACIÓN OPERATIVA
-    access_restrictions = fields.Text(string="Restricciones de Acceso")
-    allowed_collection_schedules = fields.Text(string="Horarios Permitidos para Recolección")
-    current_container_types = fields.Text(string="Tipo de Contenedores Actuales")
-    special_handling_conditions = fields.Text(string="Condiciones Especiales de Manejo")
-    seasonality = fields.Text(string="Estacionalidad")
+    access_restrictions = fields.Text(string="Restricciones de Acceso", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    allowed_collection_schedules = fields.Text(string="Horarios Permitidos para Recolección", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    current_container_types = fields.Text(string="Tipo de Contenedores Actuales", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    special_handling_conditions = fields.Text(string="Condiciones Especiales de Manejo", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    seasonality = fields.Text(string="Estacionalidad", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
 
     # INFORMACIÓN REGULATORIA
     waste_generator_registration = fields.Char(string="Registro como Generador de Residuos")
-    environmental_authorizations = fields.Text(string="Autorizaciones Ambientales Vigentes")
-    quality_certifications = fields.Text(string="Certificaciones de Calidad")
-    other_relevant_permits = fields.Text(string="Otros Permisos Relevantes")
+    environmental_authorizations = fields.Text(string="Autorizaciones Ambientales Vigentes", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    quality_certifications = fields.Text(string="Certificaciones de Calidad", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    other_relevant_permits = fields.Text(string="Otros Permisos Relevantes", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
 
     # COMPETENCIA Y MERCADO
     current_service_provider = fields.Char(string="Proveedor Actual de Servicios")
@@ -152,11 +245,11 @@ class SaleOrder(models.Model):
         ('muy_alto', 'Muy Alto')
     ], string="Nivel de Satisfacción con Proveedor Actual")
 
-    reason_for_new_provider = fields.Text(string="Motivo de Búsqueda de Nuevo Proveedor")
+    reason_for_new_provider = fields.Text(string="Motivo de Búsqueda de Nuevo Proveedor", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
 
     # REQUERIMIENTOS ESPECIALES
-    specific_certificates_needed = fields.Text(string="Necesidad de Certificados Específicos")
-    reporting_requirements = fields.Text(string="Requerimientos de Reporteo")
+    specific_certificates_needed = fields.Text(string="Necesidad de Certificados Específicos", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    reporting_requirements = fields.Text(string="Requerimientos de Reporteo", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
     service_urgency = fields.Selection([
         ('inmediata', 'Inmediata'),
         ('1_semana', '1 Semana'),
@@ -169,8 +262,38 @@ class SaleOrder(models.Model):
 
     # CAMPOS DE SEGUIMIENTO
     next_contact_date = fields.Datetime(string="Fecha de Próximo Contacto")
-    pending_actions = fields.Text(string="Acciones Pendientes")
-    conversation_notes = fields.Text(string="Notas de Conversaciones")
+    pending_actions = fields.Text(string="Acciones Pendientes", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+    conversation_notes = fields.Text(string="Notas de Conversaciones", compute='_compute_prospect_profile_fields', inverse='_inverse_prospect_profile_fields')
+
+    # -------------------------------------------------------------------------
+    # PERFIL DEL PROSPECTO (copy-on-write)
+    # -------------------------------------------------------------------------
+    @api.depends(*('prospect_profile_id.%s' % fname for fname in PROSPECT_PROFILE_FIELDS))
+    def _compute_prospect_profile_fields(self):
+        for order in self:
+            profile = order.prospect_profile_id
+            for fname in PROSPECT_PROFILE_FIELDS:
+                order[fname] = profile[fname]
+
+    def _inverse_prospect_profile_fields(self):
+        """
+        Editar el perfil en una cotización no altera al lead ni a otras
+        cotizaciones: si el perfil es compartido se copia antes de escribir.
+        """
+        Profile = self.env['sale.prospect.profile']
+        for order in self:
+            vals = {fname: order[fname] for fname in PROSPECT_PROFILE_FIELDS}
+            profile = order.prospect_profile_id
+            if not profile:
+                if any(vals.values()):
+                    order.prospect_profile_id = Profile.create(dict(vals, partner_id=order.partner_id.id))
+                continue
+            if all(profile[fname] == value for fname, value in vals.items()):
+                continue
+            if profile._is_shared_with_others(order):
+                order.prospect_profile_id = profile.copy(dict(vals, partner_id=order.partner_id.id))
+            else:
+                profile.write(vals)
 
     # -------------------------------------------------------------------------
     # HELPERS: FORMATO DIRECCIÓN EN UNA LÍNEA (solo para display / reportes)
@@ -186,9 +309,28 @@ class SaleOrder(models.Model):
         parts = [p.strip().strip(',') for p in addr.splitlines() if p.strip()]
         return ', '.join(parts) if parts else (partner.name or False)
 
+    @api.depends(*(
+        '%s.%s' % (partner_fname, address_fname)
+        for partner_fname in ('pickup_location_id', 'final_destination_id')
+        for address_fname in ('name', 'street', 'street2', 'city', 'zip', 'state_id', 'country_id', 'commercial_company_name')
+    ))
+    def _compute_partner_addresses(self):
+        # Un solo formateo por partner distinto en todo el lote
+        addresses = {}
+        for partner in (self.pickup_location_id | self.final_destination_id):
+            addresses[partner.id] = self._format_partner_address_one_line(partner)
+        for order in self:
+            order.pickup_location_address = addresses.get(order.pickup_location_id.id, False)
+            order.final_destination_address = addresses.get(order.final_destination_id.id, False)
+
     # -------------------------------------------------------------------------
     # HELPERS: AUTOFILL pickup_location_id desde partner_shipping_id/partner_id
     # -------------------------------------------------------------------------
+    # Campos cuyo cambio (en write) puede requerir re-llenar pickup_location_id
+    _PICKUP_AUTOFILL_TRIGGER_FIELDS = (
+        'partner_id', 'partner_shipping_id', 'pickup_location_id', 'pickup_location_manual',
+    )
+
     def _autofill_pickup_location(self, force=False):
         """
         Si pickup_location_id está vacío (o force=True) y no es manual,
@@ -197,6 +339,8 @@ class SaleOrder(models.Model):
         if self.env.context.get('skip_pickup_autofill'):
             return
 
+        # Agrupar por partner destino: un solo write por partner distinto
+        order_ids_by_partner = defaultdict(list)
         for order in self:
             if order.pickup_location_manual:
                 continue
@@ -205,10 +349,13 @@ class SaleOrder(models.Model):
 
             partner = order.partner_shipping_id or order.partner_id
             if partner and partner.id != (order.pickup_location_id.id if order.pickup_location_id else False):
-                order.with_context(skip_pickup_autofill=True).write({
-                    'pickup_location_id': partner.id,
-                    'pickup_location_manual': False,
-                })
+                order_ids_by_partner[partner.id].append(order.id)
+
+        for partner_id, order_ids in order_ids_by_partner.items():
+            self.browse(order_ids).with_context(skip_pickup_autofill=True).write({
+                'pickup_location_id': partner_id,
+                'pickup_location_manual': False,
+            })
 
     @api.onchange('partner_id', 'partner_shipping_id')
     def _onchange_partner_autofill_pickup_location(self):
@@ -224,8 +371,41 @@ class SaleOrder(models.Model):
     # -------------------------------------------------------------------------
     @api.depends('child_quotations_ids')
     def _compute_child_quotations_count(self):
+        # Un solo conteo agrupado para todo el recordset (sin cargar los One2many)
+        counts = {}
+        if self.ids:
+            counts = {
+                parent.id: count
+                for parent, count in self._read_group(
+                    [('related_quotation_id', 'in', self.ids)],
+                    ['related_quotation_id'],
+                    ['__count'],
+                )
+            }
         for record in self:
-            record.child_quotations_count = len(record.child_quotations_ids)
+            record.child_quotations_count = counts.get(record._origin.id, 0)
+
+    @api.depends('order_line.residue_weight_kg', 'order_line.residue_volume', 'order_line.residue_type', 'order_line.plan_manejo')
+    def _compute_residue_summary(self):
+        for order in self:
+            total_kg = total_volume = 0.0
+            by_type = defaultdict(float)
+            by_plan = defaultdict(float)
+            for line in order.order_line:
+                if line.display_type:
+                    continue
+                total_kg += line.residue_weight_kg
+                total_volume += line.residue_volume
+                if line.residue_type:
+                    by_type[line.residue_type] += line.residue_weight_kg
+                if line.plan_manejo:
+                    by_plan[line.plan_manejo] += line.residue_weight_kg
+            order.residue_total_weight_kg = total_kg
+            order.residue_total_volume = total_volume
+            order.residue_weight_rsu_kg = by_type['rsu']
+            order.residue_weight_rme_kg = by_type['rme']
+            order.residue_weight_rp_kg = by_type['rp']
+            order.residue_weight_by_plan = dict(by_plan) or False
 
     def action_view_child_quotations(self):
         """Acción para ver las cotizaciones derivadas"""
@@ -242,176 +422,644 @@ class SaleOrder(models.Model):
             }
         }
 
+    @api.constrains('related_quotation_id')
+    def _check_related_quotation_recursion(self):
+        if self._has_cycle():
+            raise ValidationError(_('Una cotización no puede derivar de sí misma ni de sus descendientes.'))
+
+    def _get_quotation_chain(self):
+        """
+        Devuelve la cadena completa (raíz y todos sus descendientes) de las
+        cotizaciones, en una sola consulta sobre parent_path.
+        """
+        root_ids = {int(order.parent_path.split('/')[0]) for order in self if order.parent_path}
+        if not root_ids:
+            return self.browse()
+        domain = ['|'] * (len(root_ids) - 1) + [
+            ('parent_path', '=like', '%s/%%' % root_id) for root_id in root_ids
+        ]
+        return self.search(domain)
+
+    def action_view_quotation_lineage(self):
+        """Acción para ver la cadena completa de cotizaciones relacionadas"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f'Cadena de Cotizaciones de {self.name}',
+            'res_model': 'sale.order',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', self._get_quotation_chain().ids)],
+            'context': {
+                'default_partner_id': self.partner_id.id,
+                'default_related_quotation_id': self.id,
+            }
+        }
+
     def action_create_related_quotation(self):
         """Acción para crear una nueva cotización relacionada"""
         self.ensure_one()
+        context = {
+            'default_partner_id': self.partner_id.id,
+            'default_related_quotation_id': self.id,
+            'default_always_service': True,
+        }
+        # Mismos campos que la propagación CRM marcados como "relacionados"
+        for _lead_fname, order_fname, _default, related in self._get_crm_field_mapping():
+            if related:
+                value = self[order_fname]
+                if isinstance(value, models.BaseModel):
+                    value = value.id
+                context['default_%s' % order_fname] = value
         return {
             'type': 'ir.actions.act_window',
             'name': f'Nueva Cotización para {self.partner_id.name}',
             'res_model': 'sale.order',
             'view_mode': 'form',
             'target': 'current',
-            'context': {
-                'default_partner_id': self.partner_id.id,
-                'default_related_quotation_id': self.id,
-                'default_service_frequency': self.service_frequency,
+            'context': context,
+        }
+
+    # -------------------------------------------------------------------------
+    # HELPERS: PROPAGACIÓN CRM -> SALE (por lotes)
+    # -------------------------------------------------------------------------
+    # (campo en crm.lead, campo en sale.order, ¿se copia a cotizaciones relacionadas?)
+    _CRM_FIELD_MAP = (
+        ('service_frequency', 'service_frequency', True),
+        ('residue_new', 'residue_new', False),
+        ('requiere_visita', 'requiere_visita', False),
+        ('pickup_location_id', 'pickup_location_id', True),
+        ('final_destination_id', 'final_destination_id', True),
+
+        # INFORMACIÓN BÁSICA DEL PROSPECTO
+        ('company_size', 'company_size', True),
+        ('industrial_sector', 'industrial_sector', True),
+        ('prospect_priority', 'prospect_priority', True),
+        ('estimated_business_potential', 'estimated_business_potential', False),
+
+        # INFORMACIÓN REGULATORIA
+        ('waste_generator_registration', 'waste_generator_registration', False),
+
+        # COMPETENCIA Y MERCADO
+        ('current_service_provider', 'current_service_provider', False),
+        ('current_costs', 'current_costs', False),
+        ('current_provider_satisfaction', 'current_provider_satisfaction', False),
+
+        # REQUERIMIENTOS ESPECIALES
+        ('service_urgency', 'service_urgency', False),
+        ('estimated_budget', 'estimated_budget', False),
+
+        # CAMPOS DE SEGUIMIENTO
+        ('next_contact_date', 'next_contact_date', False),
+
+        # Los bloques de texto (PROSPECT_PROFILE_FIELDS) se propagan vía sale.prospect.profile
+    )
 
-                # CAMBIO: defaults como Many2one (selección real)
-                'default_pickup_location_id': self.pickup_location_id.id if self.pickup_location_id else False,
-                'default_final_destination_id': self.final_destination_id.id if self.final_destination_id else False,
+    # Valor por defecto según tipo cuando el lead no tiene el campo
+    _CRM_TYPE_DEFAULTS = {
+        'float': 0.0,
+        'monetary': 0.0,
+        'integer': 0,
+    }
 
-                'default_company_size': self.company_size,
-                'default_industrial_sector': self.industrial_sector,
-                'default_prospect_priority': self.prospect_priority,
-                'default_always_service': True,
-            }
+    @api.model
+    @tools.ormcache()
+    def _get_crm_field_mapping(self):
+        """
+        Mapeo efectivo crm.lead -> sale.order, introspeccionado una sola vez
+        por carga del registry.
+        Devuelve tuplas (campo_lead | False, campo_orden, default, copia_relacionada).
+        """
+        lead_fields = self.env['crm.lead']._fields
+        mapping = []
+        for lead_fname, order_fname, related in self._CRM_FIELD_MAP:
+            field = self._fields.get(order_fname)
+            if not field:
+                continue
+            mapping.append((
+                lead_fname if lead_fname in lead_fields else False,
+                order_fname,
+                self._CRM_TYPE_DEFAULTS.get(field.type, False),
+                related,
+            ))
+        return tuple(mapping)
+
+    @api.model
+    def _prepare_crm_order_vals(self, leads):
+        """
+        Valores de cabecera de la cotización para cada lead, con un único
+        leads.read() de los campos mapeados. Devuelve {lead_id: vals}.
+        """
+        mapping = self._get_crm_field_mapping()
+        lead_fnames = [lead_fname for lead_fname, _o, _d, _r in mapping if lead_fname]
+        rows = leads.read(lead_fnames) if lead_fnames else [{'id': lead.id} for lead in leads]
+
+        result = {}
+        for row in rows:
+            vals = {}
+            for lead_fname, order_fname, default, _related in mapping:
+                value = row.get(lead_fname, default) if lead_fname else default
+                # Many2one: read() devuelve (id, display_name)
+                if isinstance(value, tuple):
+                    value = value[0]
+                vals[order_fname] = value if value is not None else default
+
+            # CAMBIO: guardar selección real (marcadas como manual si vienen del CRM)
+            vals['pickup_location_manual'] = bool(vals.get('pickup_location_id'))
+            vals['final_destination_manual'] = bool(vals.get('final_destination_id'))
+            vals['always_service'] = True
+            result[row['id']] = vals
+        return result
+
+    def _prepare_crm_residue_line_vals(self, res):
+        """Valores de la línea de venta a partir de un crm.lead.residue."""
+        product_id = res.product_id.id if res.product_id else False
+        product_name = res.product_id.name if res.product_id else res.name
+
+        # Protección contra duplicados (servicio)
+        is_new_service = res.create_new_service
+        existing_srv_id = res.existing_service_id.id if res.existing_service_id else False
+        if product_id:
+            is_new_service = False
+            existing_srv_id = product_id
+
+        # Protección contra duplicados (embalaje)
+        packaging_id = res.packaging_id.id if res.packaging_id else False
+        is_new_packaging = res.create_new_packaging
+        packaging_name_val = res.packaging_name
+        if packaging_id:
+            is_new_packaging = False
+            packaging_name_val = False
+
+        line_data = {
+            'product_id': product_id,
+            'name': product_name or 'Nuevo Servicio',
+            'product_uom_qty': res.volume,
+
+            # Lógica servicio
+            'create_new_service': is_new_service,
+            'existing_service_id': existing_srv_id,
+
+            'residue_name': res.name,
+            'residue_type': res.residue_type,
+            'plan_manejo': res.plan_manejo,
+
+            # Lógica embalaje
+            'create_new_packaging': is_new_packaging,
+            'packaging_name': packaging_name_val,
+            'residue_packaging_id': packaging_id,
+
+            # Medidas
+            'residue_capacity': res.capacity,
+            'residue_weight_kg': res.weight_kg,
+            'residue_volume': res.volume,
+            'weight_per_unit': res.weight_per_unit,
+            'residue_uom_id': res.uom_id.id if res.uom_id else False,
+
+            # Origen CRM (para la re-sincronización incremental)
+            'crm_residue_id': res.id,
+            'crm_propagated': True,
         }
 
+        # UoM de la línea de venta
+        if res.uom_id:
+            line_data['product_uom_id'] = res.uom_id.id
+        elif res.product_id and res.product_id.uom_id:
+            line_data['product_uom_id'] = res.product_id.uom_id.id
+
+        line_data['crm_residue_hash'] = self._crm_residue_fingerprint(line_data)
+        return line_data
+
+    @api.model
+    def _crm_residue_fingerprint(self, line_data):
+        """Huella (sha1) de los campos sincronizados (_CRM_RESIDUE_SYNC_FIELDS) de un residuo."""
+        payload = sorted(
+            (fname, line_data[fname]) for fname in self._CRM_RESIDUE_SYNC_FIELDS if fname in line_data
+        )
+        return hashlib.sha1(repr(payload).encode()).hexdigest()
+
+    @api.model
+    def _merge_crm_vals(self, vals_list):
+        """
+        Fusiona en vals_list (in situ) los valores del lead ANTES del create,
+        para que órdenes y líneas se creen en una sola llamada.
+        Todos los leads y sus residuos se leen de una vez (prefetch compartido).
+        """
+        default_opportunity_id = self.env.context.get('default_opportunity_id')
+        lead_ids = {
+            vals.get('opportunity_id') or default_opportunity_id
+            for vals in vals_list
+        } - {False, None}
+        if not lead_ids:
+            return vals_list
+
+        Lead = self.env['crm.lead']
+        leads = Lead.browse(lead_ids)
+        if 'residue_line_ids' in Lead._fields:
+            # Una sola lectura de todos los residuos de todos los leads
+            leads.mapped('residue_line_ids')
+        # Al iterar el recordset, cada lead conserva el prefetch del lote
+        leads_by_id = {lead.id: lead for lead in leads}
+        order_vals_by_lead = self._prepare_crm_order_vals(leads)
+        profiles_by_lead = self.env['sale.prospect.profile']._get_or_create_for_leads(leads)
+
+        for vals in vals_list:
+            opportunity_id = vals.get('opportunity_id') or default_opportunity_id
+            if not opportunity_id:
+                continue
+
+            lead = leads_by_id[opportunity_id]
+            vals.update(order_vals_by_lead[opportunity_id])
+            vals['prospect_profile_id'] = profiles_by_lead[opportunity_id].id
+            # Los textos llegan por el perfil compartido, no por el inverse
+            for fname in PROSPECT_PROFILE_FIELDS:
+                vals.pop(fname, None)
+
+            # Preparar líneas si hay residuos en el lead (sin repetir los que ya vienen en vals)
+            present = {
+                command[2].get('crm_residue_id')
+                for command in vals.get('order_line') or []
+                if len(command) > 2 and isinstance(command[2], dict)
+            }
+            lines = [
+                (0, 0, self._prepare_crm_residue_line_vals(res))
+                for res in getattr(lead, 'residue_line_ids', self.env['crm.lead.residue'])
+                if res.id not in present
+            ]
+            if lines:
+                vals['order_line'] = list(vals.get('order_line') or []) + lines
+
+        return vals_list
+
     # -------------------------------------------------------------------------
-    # CRUD
+    # RE-SINCRONIZACIÓN INCREMENTAL CRM -> COTIZACIONES ABIERTAS
     # -------------------------------------------------------------------------
-    @api.model_create_multi
-    def create(self, vals_list):
+    # Campos de cabecera que el usuario puede fijar a mano (flag *_user_set).
+    # Los *_manual solo frenan el autofill: también se activan con valores del CRM.
+    _CRM_USER_SET_FLAGS = {
+        'pickup_location_id': 'pickup_location_user_set',
+        'final_destination_id': 'final_destination_user_set',
+    }
+
+    # Campos de línea que se actualizan si cambian en el residuo del lead.
+    # La huella (crm_residue_hash) se calcula exactamente sobre estos campos.
+    _CRM_RESIDUE_SYNC_FIELDS = (
+        'residue_name', 'residue_type', 'plan_manejo',
+        'residue_capacity', 'residue_weight_kg', 'residue_volume',
+        'product_uom_qty',
+        # Servicio
+        'product_id', 'create_new_service', 'existing_service_id',
+        # Embalaje
+        'create_new_packaging', 'packaging_name', 'residue_packaging_id',
+        # Unidades de medida
+        'residue_uom_id', 'product_uom_id',
+    )
+
+    _CRM_SYNC_WATERMARK_PARAM = 'sale_crm_propagate.crm_sync_watermark'
+    # write_date es la hora de inicio de la transacción: un lead escrito por una
+    # transacción que confirma después de la búsqueda queda por debajo de la
+    # marca. Se re-examina este solape en cada corrida (la sincronización es
+    # idempotente por hash, re-revisar no reescribe nada).
+    _CRM_SYNC_OVERLAP = timedelta(minutes=10)
+
+    @api.model
+    def _crm_value_to_write(self, value):
+        return value.id if isinstance(value, models.BaseModel) else value
+
+    def _prepare_crm_sync_header_vals(self, crm_vals):
+        """Delta de cabecera respecto al lead, respetando los flags *_manual."""
+        self.ensure_one()
+        mapped_fnames = {order_fname for _lead_fname, order_fname, _default, _related in self._get_crm_field_mapping()}
+        delta = {}
+        for fname, value in crm_vals.items():
+            if fname not in mapped_fnames:
+                continue
+            current = self._crm_value_to_write(self[fname])
+            user_set_flag = self._CRM_USER_SET_FLAGS.get(fname)
+            # Un valor editado por el usuario solo se rellena si está vacío
+            if user_set_flag and self[user_set_flag] and current:
+                continue
+            if current != value:
+                delta[fname] = value
+        return delta
+
+    @api.model
+    def _prepare_crm_sync_line_delta(self, line, line_vals):
         """
-        Sobrescritura de create para manejar la propagación de datos desde CRM.
-        Utiliza api.model_create_multi para soportar la creación por lotes (estándar Odoo 19).
+        Campos de _CRM_RESIDUE_SYNC_FIELDS que difieren entre la línea y el residuo.
+        Producto y embalaje nuevos los resuelve write() por nombre: no se vacían
+        mientras el nombre (o el modo "nuevo") no cambie.
         """
-        orders = super().create(vals_list)
+        skip = set()
+        if line_vals.get('create_new_service') and not line_vals.get('product_id'):
+            if line.create_new_service and line.residue_name == line_vals.get('residue_name'):
+                skip.add('product_id')
+        if line_vals.get('create_new_packaging') and not line_vals.get('residue_packaging_id'):
+            skip.add('residue_packaging_id')
+        if not line_vals.get('residue_uom_id'):
+            # create() asigna la UoM de servicio por defecto
+            skip.add('residue_uom_id')
+        return {
+            fname: line_vals[fname]
+            for fname in self._CRM_RESIDUE_SYNC_FIELDS
+            if fname in line_vals and fname not in skip
+            and self._crm_value_to_write(line[fname]) != line_vals[fname]
+        }
 
-        for order, vals in zip(orders, vals_list):
-            opportunity_id = vals.get('opportunity_id') or self.env.context.get('default_opportunity_id')
-            if not opportunity_id:
+    def _prepare_crm_sync_line_commands(self, lead):
+        """
+        Comandos add/update/remove de líneas respecto a los residuos del lead.
+        Las líneas sin vínculo (anteriores a la re-sincronización) se enlazan
+        por nombre de residuo normalizado en vez de duplicarse.
+        """
+        self.ensure_one()
+        residues = getattr(lead, 'residue_line_ids', self.env['crm.lead.residue'])
+        crm_lines = self.order_line.filtered('crm_propagated')
+        lines_by_residue = {line.crm_residue_id.id: line for line in crm_lines if line.crm_residue_id}
+        unlinked_by_name = defaultdict(list)
+        for line in self.order_line:
+            if not line.crm_propagated and not line.crm_residue_id and not line.display_type and line.residue_name:
+                unlinked_by_name[normalize_residue_name(line.residue_name)].append(line)
+
+        commands = []
+        for res in residues:
+            line = lines_by_residue.pop(res.id, None)
+            line_vals = self._prepare_crm_residue_line_vals(res)
+            if not line:
+                candidates = unlinked_by_name.get(normalize_residue_name(res.name))
+                if not candidates:
+                    commands.append((0, 0, line_vals))
+                    continue
+                line = candidates.pop(0)
+                delta = self._prepare_crm_sync_line_delta(line, line_vals)
+                delta.update({
+                    'crm_residue_id': res.id,
+                    'crm_propagated': True,
+                    'crm_residue_hash': line_vals['crm_residue_hash'],
+                })
+                commands.append((1, line.id, delta))
+                continue
+            # Misma huella: el residuo no cambió desde la última propagación
+            if line.crm_residue_hash == line_vals['crm_residue_hash']:
                 continue
+            delta = self._prepare_crm_sync_line_delta(line, line_vals)
+            delta['crm_residue_hash'] = line_vals['crm_residue_hash']
+            commands.append((1, line.id, delta))
+
+        # Residuos borrados en el lead (o líneas cuyo residuo ya no existe)
+        orphan_lines = crm_lines.filtered(lambda l: not l.crm_residue_id) | self.env['sale.order.line'].concat(
+            *lines_by_residue.values()
+        )
+        commands.extend((2, line.id) for line in orphan_lines)
+        return commands
+
+    def _sync_from_crm(self):
+        """
+        Aplica a las cotizaciones abiertas solo el delta respecto a su lead:
+        campos mapeados, perfil del prospecto y líneas de residuos.
+        Devuelve las órdenes modificadas.
+        """
+        orders = self.filtered(lambda o: o.opportunity_id and o.state in ('draft', 'sent'))
+        if not orders:
+            return self.browse()
+
+        leads = orders.opportunity_id
+        if 'residue_line_ids' in leads._fields:
+            leads.mapped('residue_line_ids')
+        order_vals_by_lead = self._prepare_crm_order_vals(leads)
+        profiles_by_lead = self.env['sale.prospect.profile']._get_or_create_for_leads(leads)
+        orders.mapped('order_line.crm_residue_id')
+
+        updated = self.browse()
+        for order in orders:
+            lead = order.opportunity_id
+            vals = order._prepare_crm_sync_header_vals(order_vals_by_lead[lead.id])
+            # Un perfil propio (editado en la cotización) no se reemplaza
+            profile = profiles_by_lead[lead.id]
+            if not order.prospect_profile_id:
+                vals['prospect_profile_id'] = profile.id
+            commands = order._prepare_crm_sync_line_commands(lead)
+            if commands:
+                vals['order_line'] = commands
+            if vals:
+                order.with_context(crm_sync=True).write(vals)
+                updated |= order
+        return updated
+
+    def action_sync_from_crm(self):
+        """Acción: re-sincroniza las cotizaciones seleccionadas con su oportunidad."""
+        updated = self._sync_from_crm()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Sincronización con CRM'),
+                'message': _('%s cotización(es) actualizada(s).', len(updated)),
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
 
-            lead = self.env['crm.lead'].browse(opportunity_id)
-
-            # -----------------------------
-            # Pickup desde CRM (Many2one)
-            # -----------------------------
-            lead_pickup = getattr(lead, 'pickup_location_id', False)
-            pickup_partner_id = lead_pickup.id if lead_pickup else False
-
-            # -----------------------------
-            # Destino final desde CRM (Many2one)
-            # -----------------------------
-            lead_final_dest = getattr(lead, 'final_destination_id', False)
-            final_dest_partner_id = lead_final_dest.id if lead_final_dest else False
-
-            update_vals = {
-                'service_frequency': getattr(lead, 'service_frequency', False),
-                'residue_new': getattr(lead, 'residue_new', False),
-                'requiere_visita': getattr(lead, 'requiere_visita', False),
-
-                # CAMBIO: guardar selección real
-                'pickup_location_id': pickup_partner_id,
-                'pickup_location_manual': bool(pickup_partner_id),
-
-                'final_destination_id': final_dest_partner_id,
-                'final_destination_manual': bool(final_dest_partner_id),
-
-                'always_service': True,
-
-                # INFORMACIÓN BÁSICA DEL PROSPECTO
-                'company_size': getattr(lead, 'company_size', False),
-                'industrial_sector': getattr(lead, 'industrial_sector', False),
-                'prospect_priority': getattr(lead, 'prospect_priority', False),
-                'estimated_business_potential': getattr(lead, 'estimated_business_potential', 0.0),
-
-                # INFORMACIÓN OPERATIVA
-                'access_restrictions': getattr(lead, 'access_restrictions', False),
-                'allowed_collection_schedules': getattr(lead, 'allowed_collection_schedules', False),
-                'current_container_types': getattr(lead, 'current_container_types', False),
-                'special_handling_conditions': getattr(lead, 'special_handling_conditions', False),
-                'seasonality': getattr(lead, 'seasonality', False),
-
-                # INFORMACIÓN REGULATORIA
-                'waste_generator_registration': getattr(lead, 'waste_generator_registration', False),
-                'environmental_authorizations': getattr(lead, 'environmental_authorizations', False),
-                'quality_certifications': getattr(lead, 'quality_certifications', False),
-                'other_relevant_permits': getattr(lead, 'other_relevant_permits', False),
-
-                # COMPETENCIA Y MERCADO
-                'current_service_provider': getattr(lead, 'current_service_provider', False),
-                'current_costs': getattr(lead, 'current_costs', 0.0),
-                'current_provider_satisfaction': getattr(lead, 'current_provider_satisfaction', False),
-                'reason_for_new_provider': getattr(lead, 'reason_for_new_provider', False),
-
-                # REQUERIMIENTOS ESPECIALES
-                'specific_certificates_needed': getattr(lead, 'specific_certificates_needed', False),
-                'reporting_requirements': getattr(lead, 'reporting_requirements', False),
-                'service_urgency': getattr(lead, 'service_urgency', False),
-                'estimated_budget': getattr(lead, 'estimated_budget', 0.0),
-
-                # CAMPOS DE SEGUIMIENTO
-                'next_contact_date': getattr(lead, 'next_contact_date', False),
-                'pending_actions': getattr(lead, 'pending_actions', False),
-                'conversation_notes': getattr(lead, 'conversation_notes', False),
+    @api.model
+    def _cron_sync_from_crm(self):
+        """
+        Cron incremental: solo examina leads (o residuos) modificados desde la
+        última ejecución. La marca de agua es el write_date más alto realmente
+        procesado (no la hora del cron) y se busca con _CRM_SYNC_OVERLAP de margen.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        watermark = fields.Datetime.to_datetime(ICP.get_param(self._CRM_SYNC_WATERMARK_PARAM))
+
+        Lead = self.env['crm.lead'].with_context(active_test=False)
+        Residue = self.env['crm.lead.residue']
+        if watermark:
+            since = watermark - self._CRM_SYNC_OVERLAP
+            leads = Lead.search([('write_date', '>', since)])
+            residues = Residue.search([('write_date', '>', since)])
+            processed = leads.mapped('write_date') + residues.mapped('write_date')
+            leads |= residues.lead_id
+            orders = self.search([('opportunity_id', 'in', leads.ids), ('state', 'in', ('draft', 'sent'))])
+        else:
+            # Primera corrida: el máximo se toma antes de buscar las órdenes
+            processed = [
+                max_date
+                for model in (Lead, Residue)
+                for [max_date] in model._read_group([], aggregates=['write_date:max'])
+            ]
+            orders = self.search([('opportunity_id', '!=', False), ('state', 'in', ('draft', 'sent'))])
+
+        updated = orders._sync_from_crm()
+        _logger.info("CRM sync: %s cotizaciones revisadas, %s actualizadas", len(orders), len(updated))
+        new_watermark = max(filter(None, [watermark, *processed]), default=None)
+        if new_watermark and new_watermark != watermark:
+            ICP.set_param(self._CRM_SYNC_WATERMARK_PARAM, fields.Datetime.to_string(new_watermark))
+
+    # -------------------------------------------------------------------------
+    # RECOLECCIONES PROGRAMADAS (service_frequency -> sale.collection.event)
+    # -------------------------------------------------------------------------
+    # Ventana móvil de generación: las recolecciones se generan hasta
+    # expiration_date, pero nunca más allá de hoy + esta ventana. Como
+    # expiration_date tiene default (31/12), la ventana aplica a casi todas
+    # las órdenes y el cron la va extendiendo hasta la vigencia.
+    _COLLECTION_HORIZON_DAYS = 90
+    # Campos cuyo cambio en una orden confirmada regenera las recolecciones futuras
+    _COLLECTION_RESCHEDULE_FIELDS = ('service_frequency', 'expiration_date')
+
+    def _compute_collection_event_count(self):
+        counts = {}
+        if self.ids:
+            counts = {
+                order.id: count
+                for order, count in self.env['sale.collection.event']._read_group(
+                    [('order_id', 'in', self.ids), ('state', '!=', 'cancel')],
+                    ['order_id'],
+                    ['__count'],
+                )
             }
+        for order in self:
+            order.collection_event_count = counts.get(order._origin.id, 0)
 
-            # Preparar líneas si hay residuos en el lead
-            lines = []
-            for res in getattr(lead, 'residue_line_ids', self.env['crm.lead.residue']):
-                product_id = res.product_id.id if res.product_id else False
-                product_name = res.product_id.name if res.product_id else res.name
-
-                # Protección contra duplicados (servicio)
-                is_new_service = res.create_new_service
-                existing_srv_id = res.existing_service_id.id if res.existing_service_id else False
-                if product_id:
-                    is_new_service = False
-                    existing_srv_id = product_id
-
-                # Protección contra duplicados (embalaje)
-                packaging_id = res.packaging_id.id if res.packaging_id else False
-                is_new_packaging = res.create_new_packaging
-                packaging_name_val = res.packaging_name
-                if packaging_id:
-                    is_new_packaging = False
-                    packaging_name_val = False
-
-                line_data = {
-                    'product_id': product_id,
-                    'name': product_name or 'Nuevo Servicio',
-                    'product_uom_qty': res.volume,
-
-                    # Lógica servicio
-                    'create_new_service': is_new_service,
-                    'existing_service_id': existing_srv_id,
-
-                    'residue_name': res.name,
-                    'residue_type': res.residue_type,
-                    'plan_manejo': res.plan_manejo,
-
-                    # Lógica embalaje
-                    'create_new_packaging': is_new_packaging,
-                    'packaging_name': packaging_name_val,
-                    'residue_packaging_id': packaging_id,
-
-                    # Medidas
-                    'residue_capacity': res.capacity,
-                    'residue_weight_kg': res.weight_kg,
-                    'residue_volume': res.volume,
-                    'weight_per_unit': res.weight_per_unit,
-                    'residue_uom_id': res.uom_id.id if res.uom_id else False,
-                }
-
-                # UoM de la línea de venta
-                if res.uom_id:
-                    line_data['product_uom_id'] = res.uom_id.id
-                elif res.product_id and res.product_id.uom_id:
-                    line_data['product_uom_id'] = res.product_id.uom_id.id
-
-                lines.append((0, 0, line_data))
+    def _generate_collection_events(self):
+        """
+        Extiende las recolecciones de las órdenes confirmadas desde
+        collection_horizon_date hasta la menor entre expiration_date y la
+        ventana móvil. Un solo create() para todo el recordset; nunca
+        regenera lo ya generado.
+        """
+        today = fields.Date.context_today(self)
+        rolling_end = today + timedelta(days=self._COLLECTION_HORIZON_DAYS)
 
-            if lines:
-                update_vals['order_line'] = lines
+        vals_list = []
+        order_ids_by_horizon = defaultdict(list)
+        for order in self:
+            if order.state != 'sale' or not order.service_frequency:
+                continue
+            until = min(order.expiration_date, rolling_end) if order.expiration_date else rolling_end
+            horizon = order.collection_horizon_date
+            if horizon and horizon >= until:
+                continue
+            anchor = order.date_order.date() if order.date_order else today
+            vals_list.extend(
+                {'order_id': order.id, 'scheduled_date': scheduled_date}
+                for scheduled_date in collection_dates(order.service_frequency, anchor, horizon, until)
+            )
+            order_ids_by_horizon[until].append(order.id)
+
+        events = self.env['sale.collection.event'].create(vals_list)
+        for until, order_ids in order_ids_by_horizon.items():
+            self.browse(order_ids).write({'collection_horizon_date': until})
+        return events
+
+    def _reschedule_collection_events(self):
+        """Cambió la frecuencia o la vigencia: rehace solo las recolecciones futuras."""
+        if not self:
+            return
+        today = fields.Date.context_today(self)
+        self.env['sale.collection.event'].sudo().search([
+            ('order_id', 'in', self.ids),
+            ('state', '=', 'planned'),
+            ('scheduled_date', '>', today),
+        ]).unlink()
+        self.write({'collection_horizon_date': today})
+        self._generate_collection_events()
+
+    @api.model
+    def _cron_extend_collection_horizons(self):
+        """
+        Solo toca órdenes cuyo horizonte no llega aún a
+        LEAST(expiration_date, hoy + ventana); las que ya alcanzaron su
+        vigencia no se vuelven a leer. SQL directo: el dominio no compara
+        columnas entre sí.
+        """
+        today = fields.Date.context_today(self)
+        rolling_end = today + timedelta(days=self._COLLECTION_HORIZON_DAYS)
+        self.flush_model(['state', 'service_frequency', 'expiration_date', 'collection_horizon_date'])
+        self.env.cr.execute(
+            """
+            SELECT id
+              FROM sale_order
+             WHERE state = 'sale'
+               AND service_frequency IS NOT NULL
+               AND (collection_horizon_date IS NULL
+                    OR collection_horizon_date < LEAST(COALESCE(expiration_date, %(end)s), %(end)s))
+            """,
+            {'end': rolling_end},
+        )
+        orders = self.browse(row[0] for row in self.env.cr.fetchall())
+        created = 0
+        for batch in tools.split_every(500, orders.ids, self.browse):
+            created += len(batch._generate_collection_events())
+        _logger.info("Recolecciones: %s órdenes extendidas, %s eventos creados", len(orders), created)
+
+    def action_view_collection_events(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Recolecciones'),
+            'res_model': 'sale.collection.event',
+            'view_mode': 'list,calendar,form',
+            'domain': [('order_id', '=', self.id)],
+            'context': {'default_order_id': self.id},
+        }
+
+    # -------------------------------------------------------------------------
+    # CRUD
+    # -------------------------------------------------------------------------
+    @api.model
+    def default_get(self, fields_list):
+        # Un token por formulario nuevo (no como default del campo: al añadir
+        # la columna el ORM copiaría un único valor a todas las filas)
+        res = super().default_get(fields_list)
+        if 'create_request_token' in fields_list and not res.get('create_request_token'):
+            res['create_request_token'] = uuid.uuid4().hex
+        return res
+
+    @api.model
+    def _get_replayed_orders(self, vals_list):
+        """{índice en vals_list: orden ya creada con el mismo create_request_token}."""
+        tokens = {vals.get('create_request_token') for vals in vals_list} - {False, None}
+        if not tokens:
+            return {}
+        # sudo: una regla de registro (p. ej. multi-compañía) que oculte la orden
+        # haría que se intentara crear de nuevo y fallara la restricción UNIQUE
+        existing = {
+            order.create_request_token: order.sudo(False)
+            for order in self.sudo().search([('create_request_token', 'in', list(tokens))])
+        }
+        return {
+            index: existing[vals['create_request_token']]
+            for index, vals in enumerate(vals_list)
+            if vals.get('create_request_token') in existing
+        }
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Sobrescritura de create para manejar la propagación de datos desde CRM.
+        Los valores del lead se fusionan en vals_list antes de super().create(),
+        así órdenes y líneas se crean en un único create (sin write posterior).
+        Un reintento con un create_request_token ya usado devuelve esa orden.
+        """
+        replayed = self._get_replayed_orders(vals_list)
+        if replayed:
+            _logger.info("sale.order create: %s petición(es) repetida(s) por token, se devuelve la orden existente", len(replayed))
+            vals_list = [vals for index, vals in enumerate(vals_list) if index not in replayed]
 
-            order.write(update_vals)
+        with instrumentation.measure(self.env, 'propagation') as metric:
+            self._merge_crm_vals(vals_list)
+            orders = super().create(vals_list)
+            metric['created'] += len(orders) + sum(len(vals.get('order_line') or []) for vals in vals_list)
 
         # Asegurar autofill cuando NO venga del lead o venga vacío (si pickup_location_manual=True no se toca)
         orders._autofill_pickup_location(force=False)
 
-        return orders
+        if not replayed:
+            return orders
+        created = iter(orders.ids)
+        total = len(orders) + len(replayed)
+        return self.browse([
+            replayed[index].id if index in replayed else next(created)
+            for index in range(total)
+        ])
 
     def write(self, vals):
         """
@@ -423,14 +1071,27 @@ class SaleOrder(models.Model):
             return super().write(vals)
 
         # Marcar manual si se editan explícitamente (Many2one)
+        # y, salvo en la sincronización CRM, como editado por el usuario
+        user_edit = not self.env.context.get('crm_sync')
         if 'pickup_location_id' in vals:
             vals['pickup_location_manual'] = bool(vals.get('pickup_location_id'))
+            if user_edit:
+                vals['pickup_location_user_set'] = True
 
         if 'final_destination_id' in vals:
             vals['final_destination_manual'] = bool(vals.get('final_destination_id'))
+            if user_edit:
+                vals['final_destination_user_set'] = True
 
         res = super().write(vals)
 
+        if any(k in vals for k in self._COLLECTION_RESCHEDULE_FIELDS):
+            self.filtered(lambda o: o.state == 'sale')._reschedule_collection_events()
+
+        # Nada que revisar si el write no toca partner/shipping/pickup
+        if not any(k in vals for k in self._PICKUP_AUTOFILL_TRIGGER_FIELDS):
+            return res
+
         # Re-llenar pickup_location_id si cambió partner/shipping y no es manual
         if 'pickup_location_id' not in vals and any(k in vals for k in ('partner_id', 'partner_shipping_id')):
             self._autofill_pickup_location(force=True)
@@ -439,11 +1100,39 @@ class SaleOrder(models.Model):
 
         return res
 
+    def unlink(self):
+        """
+        Desliga por ORM las cotizaciones derivadas antes de borrar: el
+        ondelete='set null' de la FK se aplica en SQL y dejaría su parent_path
+        apuntando a la orden eliminada.
+        """
+        orphans = self.child_quotations_ids - self
+        if orphans:
+            orphans.write({'related_quotation_id': False})
+        return super().unlink()
+
     def action_confirm(self):
-        """Si no_delivery=True, cancela todos los albaranes tras confirmar."""
+        """
+        Las líneas de órdenes con no_delivery=True no lanzan reglas de stock
+        (ver sale.order.line._action_launch_stock_rule). Como respaldo, se
+        cancelan en un solo action_cancel los albaranes que aún existan.
+        También genera, por lotes, las recolecciones según service_frequency.
+        """
         res = super().action_confirm()
-        for order in self:
-            if order.no_delivery:
-                for picking in order.picking_ids:
-                    picking.action_cancel()
+        no_delivery_orders = self.filtered('no_delivery')
+        if no_delivery_orders:
+            pickings = no_delivery_orders.picking_ids.filtered(lambda p: p.state not in ('done', 'cancel'))
+            if pickings:
+                pickings.action_cancel()
+        self._generate_collection_events()
+        return res
+
+    def _action_cancel(self):
+        """Cancela las recolecciones pendientes; al reconfirmar se generan de nuevo."""
+        res = super()._action_cancel()
+        self.env['sale.collection.event'].search([
+            ('order_id', 'in', self.ids),
+            ('state', '=', 'planned'),
+        ]).action_cancel()
+        self.write({'collection_horizon_date': False})
         return res
@@ -1,6 +1,11 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 import logging
+from collections import defaultdict
+
+from . import instrumentation
+from .product_template import normalize_residue_name
+from .uom_uom import SERVICE_UOM_NAME
 
 _logger = logging.getLogger(__name__)
 
@@ -11,23 +16,45 @@ class SaleOrderLine(models.Model):
     # -------------------------------------------------------------------------
     # HELPERS
     # -------------------------------------------------------------------------
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_service_uom_id(self, company_id):
+        """
+        Id de la UoM 'Unidad de servicio' (ormcache por base de datos/compañía).
+        uom.uom limpia este cache al crear/renombrar/archivar/borrar la UoM de servicio.
+        """
+        instrumentation.count(self.env, 'service_uom', cache_misses=1)
+        UoM = self.env['uom.uom'].sudo()
+        service_uom = UoM.search([('name', '=ilike', SERVICE_UOM_NAME)], limit=1)
+        if not service_uom:
+            service_uom = UoM.search([('name', 'ilike', SERVICE_UOM_NAME)], limit=1)
+        return service_uom.id
+
     def _get_or_create_service_uom(self):
-        """Busca o crea la UoM 'Unidad de servicio'."""
+        """Busca o crea la UoM 'Unidad de servicio' (medido: llamadas, tiempo, consultas)."""
+        with instrumentation.measure(self.env, 'service_uom') as metric:
+            return self._find_or_create_service_uom(metric)
+
+    def _find_or_create_service_uom(self, metric):
+        """Cuerpo de _get_or_create_service_uom."""
         UoM = self.env['uom.uom'].sudo()
-        unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
 
-        # 1) Buscar existente
-        service_uom = UoM.search([('name', '=ilike', 'Unidad de servicio')], limit=1)
-        if not service_uom:
-            service_uom = UoM.search([('name', 'ilike', 'Unidad de servicio')], limit=1)
-        if service_uom:
-            return service_uom
+        # 1) Buscar existente (cacheado)
+        stats = instrumentation.get_request_stats(self.env)['service_uom']
+        misses = stats['cache_misses']
+        service_uom_id = self._get_service_uom_id(self.env.company.id)
+        if stats['cache_misses'] == misses:
+            stats['cache_hits'] += 1
+        if service_uom_id:
+            return UoM.browse(service_uom_id)
+
+        unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
 
         # 2) Crear por copia de "Unidades"
         if not unit:
             return False
 
-        vals = {'name': 'Unidad de servicio'}
+        vals = {'name': SERVICE_UOM_NAME}
         candidates = [
             'category_id', 'uom_type', 'factor', 'factor_inv',
             'ratio', 'ratio_inv', 'rounding', 'active', 'relative_uom_id'
@@ -40,43 +67,174 @@ class SaleOrderLine(models.Model):
             vals['active'] = True
 
         try:
-            return UoM.create(vals)
+            service_uom = UoM.create(vals)
+            metric['created'] += 1
+            return service_uom
         except Exception:
             return unit
 
     def _create_or_update_packaging_v19(self, record):
         """Crea una UdM para embalaje si es necesario."""
-        if not record.create_new_packaging or not record.packaging_name:
+        record._create_or_update_packaging_batch()
+
+    def _create_or_update_packaging_batch(self):
+        """
+        Crea/asigna las UdM de embalaje de un recordset de líneas.
+        Agrupa por packaging_name: una búsqueda de existentes, un solo create()
+        para las faltantes y un write por embalaje distinto.
+        """
+        lines = self.filtered(lambda l: l.create_new_packaging and l.packaging_name)
+        if not lines:
             return
+        with instrumentation.measure(self.env, 'packaging') as metric:
+            lines._assign_packaging_uoms(metric)
+
+    def _assign_packaging_uoms(self, metric):
+        """Cuerpo de _create_or_update_packaging_batch (líneas ya filtradas)."""
+        line_ids_by_name = defaultdict(list)
+        for line in self:
+            line_ids_by_name[line.packaging_name].append(line.id)
 
         UoM = self.env['uom.uom'].sudo()
-        existing = UoM.search([('name', '=', record.packaging_name)], limit=1)
-        if existing:
-            record.residue_packaging_id = existing.id
+        uoms = {}
+        for uom in UoM.search([('name', 'in', list(line_ids_by_name))]):
+            uoms.setdefault(uom.name, uom)
+
+        missing = [name for name in line_ids_by_name if name not in uoms]
+        if missing:
+            unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
+            base_vals = {}
+            if unit:
+                for f in ['category_id', 'uom_type', 'rounding', 'active', 'relative_uom_id', 'factor', 'factor_inv', 'ratio', 'ratio_inv']:
+                    if f in unit._fields and f in UoM._fields:
+                        base_vals[f] = unit[f]
+            if 'active' in UoM._fields:
+                base_vals['active'] = True
+
+            vals_list = []
+            for name in missing:
+                vals = dict(base_vals, name=name)
+                # El factor se toma de la primera línea que usa el embalaje
+                qty = self.browse(line_ids_by_name[name][0]).residue_volume or 1.0
+                if 'factor' in UoM._fields:
+                    vals['factor'] = (1.0 / qty) if qty else 1.0
+                elif 'ratio' in UoM._fields:
+                    vals['ratio'] = (1.0 / qty) if qty else 1.0
+                vals_list.append(vals)
+
+            try:
+                new_uoms = UoM.create(vals_list)
+                metric['created'] += len(new_uoms)
+                uoms.update(zip(missing, new_uoms))
+            except Exception:
+                _logger.exception("Error creando embalajes. vals=%s", vals_list)
+
+        for name, line_ids in line_ids_by_name.items():
+            uom = uoms.get(name)
+            if not uom:
+                continue
+            to_assign = self.browse(line_ids).filtered(lambda l: l.residue_packaging_id != uom)
+            if to_assign:
+                to_assign.with_context(skip_residue_line_sync=True).write({'residue_packaging_id': uom.id})
+
+    def _assign_missing_service_products(self, service_uom=None, update_uom=False):
+        """
+        Asigna producto servicio a las líneas de residuo que aún no lo tienen.
+        Resolución por lotes y un write ORM por producto distinto
+        (sin volver a disparar la lógica post-write).
+        """
+        missing = self.filtered(lambda l: l.create_new_service and l.residue_name and not l.product_id)
+        if not missing:
             return
 
-        unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
-        vals = {'name': record.packaging_name}
+        _logger.info("Líneas %s sin product_id, creando...", missing.ids)
+        services = self._resolve_service_products(missing.mapped('residue_name'), service_uom=service_uom)
 
-        if unit:
-            for f in ['category_id', 'uom_type', 'rounding', 'active', 'relative_uom_id', 'factor', 'factor_inv', 'ratio', 'ratio_inv']:
-                if f in unit._fields and f in UoM._fields:
-                    vals[f] = unit[f]
+        line_ids_by_service = defaultdict(list)
+        for line in missing:
+            service = services.get(line.residue_name)
+            if service:
+                line_ids_by_service[service].append(line.id)
 
-        qty = record.residue_volume or 1.0
-        if 'factor' in UoM._fields:
-            vals['factor'] = (1.0 / qty) if qty else 1.0
-        elif 'ratio' in UoM._fields:
-            vals['ratio'] = (1.0 / qty) if qty else 1.0
+        for service, line_ids in line_ids_by_service.items():
+            vals = {'product_id': service.id, 'name': service.name}
+            if update_uom:
+                vals['product_uom_id'] = service.uom_id.id if service.uom_id else False
+            self.browse(line_ids).with_context(skip_residue_line_sync=True).write(vals)
 
-        if 'active' in UoM._fields:
-            vals['active'] = True
+    @api.model
+    def _get_residue_service_category(self):
+        """Categoría 'Servicios de Residuos' (la crea si no existe)."""
+        Category = self.env['product.category'].sudo()
+        category = Category.search([('name', 'ilike', 'servicios de residuos')], limit=1)
+        if not category:
+            category = Category.create({'name': 'Servicios de Residuos'})
+        return category
 
-        try:
-            new_uom = UoM.create(vals)
-            record.residue_packaging_id = new_uom.id
-        except Exception as e:
-            _logger.exception("Error creando embalaje. vals=%s", vals)
+    @api.model
+    def _resolve_service_products(self, residue_names, service_uom=None):
+        """
+        Resuelve por lotes los productos servicio de varios residuos.
+        La búsqueda usa la clave normalizada indexada (residue_service_key), así
+        'Aceite usado ' y 'aceite usado' comparten producto. Un solo create()
+        para los faltantes. Devuelve {residue_name: product}.
+        """
+        keys_by_name = {
+            name: normalize_residue_name(name)
+            for name in dict.fromkeys(residue_names) if name
+        }
+        keys_by_name = {name: key for name, key in keys_by_name.items() if key}
+        if not keys_by_name:
+            return {}
+        with instrumentation.measure(self.env, 'service_product') as metric:
+            return self._resolve_service_products_by_key(keys_by_name, service_uom, metric)
+
+    @api.model
+    def _resolve_service_products_by_key(self, keys_by_name, service_uom, metric):
+        """Cuerpo de _resolve_service_products: {residue_name: clave normalizada} -> productos."""
+        Product = self.env['product.product'].sudo()
+        by_key = {}
+        for product in Product.search([('residue_service_key', 'in', list(set(keys_by_name.values())))]):
+            by_key.setdefault(product.residue_service_key, product)
+
+        # Un producto nuevo por clave distinta (se usa la primera grafía recibida)
+        missing = {}
+        for name, key in keys_by_name.items():
+            if key not in by_key:
+                missing.setdefault(key, name.strip())
+
+        if missing:
+            category = self._get_residue_service_category()
+            if service_uom is None:
+                service_uom = self._get_or_create_service_uom()
+
+            vals_list = []
+            for name in missing.values():
+                vals = {
+                    'name': name,
+                    'type': 'service',
+                    'categ_id': category.id,
+                    'sale_ok': True,
+                    'purchase_ok': False,
+                }
+                if service_uom:
+                    vals['uom_id'] = service_uom.id
+                    # En Odoo 19 es posible que uom_po_id no exista o sea requerido
+                    vals['uom_po_id'] = service_uom.id
+                vals_list.append({k: v for k, v in vals.items() if k in Product._fields})
+
+            try:
+                new_products = Product.create(vals_list)
+                metric['created'] += len(new_products)
+                _logger.info("Productos servicio creados: %s", new_products.ids)
+                by_key.update(zip(missing, new_products))
+            except Exception as e:
+                _logger.error("Error creando productos servicio %s: %s", list(missing.values()), e)
+
+        return {
+            name: by_key[key]
+            for name, key in keys_by_name.items() if key in by_key
+        }
 
     def _create_service_product(self):
         """
@@ -88,13 +246,6 @@ class SaleOrderLine(models.Model):
             _logger.debug("_create_service_product: sin residue_name, abortando")
             return None
 
-        # CORRECCIÓN: Verificar si ya existe un producto con este nombre
-        Product = self.env['product.product'].sudo()
-        existing = Product.search([('name', '=', self.residue_name)], limit=1)
-        if existing:
-            _logger.debug("_create_service_product: producto existente encontrado: %s", existing.name)
-            return existing
-
         # Evitar crear duplicados si ya tengo un product_id válido
         # CORRECCIÓN: Verificar que product_id sea un registro real (no NewId)
         if self.product_id and isinstance(self.product_id.id, int) and self.product_id.id > 0:
@@ -102,40 +253,15 @@ class SaleOrderLine(models.Model):
                 _logger.debug("_create_service_product: usando product_id existente: %s", self.product_id.name)
                 return self.product_id
 
-        Category = self.env['product.category'].sudo()
-
-        category = Category.search([('name', 'ilike', 'servicios de residuos')], limit=1)
-        if not category:
-            category = Category.create({'name': 'Servicios de Residuos'})
-
-        service_uom = self._get_or_create_service_uom()
-
-        vals = {
-            'name': self.residue_name,
-            'type': 'service',
-            'categ_id': category.id,
-            'sale_ok': True,
-            'purchase_ok': False,
-            'uom_id': service_uom.id if service_uom else False,
-        }
-
-        # En Odoo 19 es posible que uom_po_id no exista o sea requerido
-        if 'uom_po_id' in Product._fields and service_uom:
-            vals['uom_po_id'] = service_uom.id
-
-        safe_vals = {k: v for k, v in vals.items() if k in Product._fields}
-
-        try:
-            product = Product.create(safe_vals)
-            _logger.info("Producto servicio creado: %s (ID: %s)", product.name, product.id)
-            return product
-        except Exception as e:
-            _logger.error("Error creando producto servicio: %s", e)
-            return None
+        # Busca por nombre y crea solo si no existe
+        return self._resolve_service_products([self.residue_name]).get(self.residue_name)
 
     # -------------------------------------------------------------------------
     # CAMPOS
     # -------------------------------------------------------------------------
+    # Campos cuyo cambio obliga a revisar el producto servicio de la línea
+    _RESIDUE_PRODUCT_TRIGGER_FIELDS = ('create_new_service', 'residue_name', 'product_id')
+
     residue_type = fields.Selection([('rsu', 'RSU'), ('rme', 'RME'), ('rp', 'RP')], string='Tipo de manejo')
 
     plan_manejo = fields.Selection([
@@ -167,6 +293,19 @@ class SaleOrderLine(models.Model):
 
     residue_uom_id = fields.Many2one('uom.uom', string="Unidad de Medida Base", default=lambda self: self._get_or_create_service_uom())
 
+    # Origen CRM: residuo del lead del que proviene la línea (se copia con la
+    # orden, que conserva opportunity_id; la unicidad es por orden)
+    crm_residue_id = fields.Many2one('crm.lead.residue', string="Residuo CRM", ondelete='set null', index='btree_not_null')
+    crm_propagated = fields.Boolean(string="Propagada desde CRM", default=False)
+    crm_residue_hash = fields.Char(string="Huella Residuo CRM", help="Huella del contenido del residuo del lead al propagarse.")
+
+    # Un residuo del lead se propaga a lo sumo una vez por orden (los reintentos
+    # de create() se resuelven con sale.order.create_request_token)
+    _crm_residue_uniq = models.Constraint(
+        'UNIQUE(order_id, crm_residue_id)',
+        'El residuo del CRM ya está propagado en esta orden.',
+    )
+
     # -------------------------------------------------------------------------
     # ONCHANGES & LOGIC
     # -------------------------------------------------------------------------
@@ -175,19 +314,33 @@ class SaleOrderLine(models.Model):
         for record in self:
             record.weight_per_unit = (record.residue_weight_kg / record.residue_volume) if record.residue_volume else 0.0
 
-    @api.onchange('create_new_service')
-    def _onchange_create_new_service(self):
-        if self.create_new_service:
-            self.existing_service_id = False
-            self.product_id = False
-            # Asegurar UoM base
-            if not self.residue_uom_id:
-                self.residue_uom_id = self._get_or_create_service_uom()
-            # Sincronizar UoM del producto
-            self.product_uom_id = self.residue_uom_id
-        else:
-            if not self.existing_service_id:
+    @api.onchange('create_new_service', 'residue_name')
+    def _onchange_residue_service(self):
+        """
+        Único onchange del servicio nuevo (toggle "Nuevo" y nombre del residuo).
+        CORREGIDO: NO crear producto en onchange; la creación real ocurre en create/write.
+        La UoM de servicio sale del ormcache: ninguna búsqueda por tecla.
+        Tipo, plan de manejo, capacidad, embalaje y UoM base ya no disparan onchange.
+        """
+        if not self.create_new_service:
+            # Solo al apagar "Nuevo": escribir un nombre no toca el producto elegido
+            toggled = self._origin.create_new_service != self.create_new_service
+            if toggled and not self.existing_service_id:
                 self.product_id = False
+            return
+
+        self.existing_service_id = False
+        if self.product_id and self.product_id.name != self.residue_name:
+            self.product_id = False
+
+        # Asegurar UoM base y sincronizar la del producto
+        uom = self.residue_uom_id or self._get_or_create_service_uom()
+        self.residue_uom_id = uom
+        self.product_uom_id = uom
+
+        # Usar el nombre como descripción temporal
+        if self.residue_name:
+            self.name = self.residue_name
 
     @api.onchange('create_new_packaging')
     def _onchange_create_new_packaging(self):
@@ -213,32 +366,13 @@ class SaleOrderLine(models.Model):
             self.packaging_name = False
             self.residue_packaging_id = False
 
-    @api.onchange('residue_packaging_id')
-    def _onchange_residue_packaging(self):
-        """Ya NO sobrescribimos product_uom_id con el embalaje."""
-        pass
-
-    @api.onchange('residue_uom_id')
-    def _onchange_residue_uom(self):
-        """Si cambia la UoM del residuo, actualizamos la del producto."""
-        if self.residue_uom_id:
-            self.product_uom_id = self.residue_uom_id
-
-    @api.onchange('residue_name', 'plan_manejo', 'residue_type', 'residue_capacity')
-    def _onchange_residue_fields(self):
-        """
-        CORREGIDO: NO crear producto en onchange.
-        Solo preparar los datos, la creación real ocurre en create/write.
-        """
-        if self.create_new_service and self.residue_name:
-            # Usar el nombre como descripción temporal
-            self.name = self.residue_name
-            
-            # Asegurar UoM correcta
-            uom = self._get_or_create_service_uom()
-            if uom:
-                self.product_uom_id = uom
-                self.residue_uom_id = uom
+    # -------------------------------------------------------------------------
+    # STOCK
+    # -------------------------------------------------------------------------
+    def _action_launch_stock_rule(self, **kwargs):
+        """Las órdenes con no_delivery no generan abastecimientos ni albaranes."""
+        lines = self.filtered(lambda l: not l.order_id.no_delivery)
+        return super(SaleOrderLine, lines)._action_launch_stock_rule(**kwargs)
 
     # -------------------------------------------------------------------------
     # CRUD - CORRECCIÓN PRINCIPAL
@@ -246,7 +380,13 @@ class SaleOrderLine(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         uom_service = self._get_or_create_service_uom()
-        
+
+        # CORRECCIÓN PRINCIPAL: Resolver/crear productos ANTES de crear las líneas (por lotes)
+        products_by_name = self._resolve_service_products([
+            vals['residue_name'] for vals in vals_list
+            if vals.get('create_new_service') and vals.get('residue_name') and not vals.get('product_id')
+        ], service_uom=uom_service)
+
         for vals in vals_list:
             # Asegurar UoM por defecto
             if not vals.get('residue_uom_id') and uom_service:
@@ -254,88 +394,40 @@ class SaleOrderLine(models.Model):
             if not vals.get('product_uom_id') and uom_service:
                 vals['product_uom_id'] = uom_service.id
 
-            # CORRECCIÓN PRINCIPAL: Crear producto ANTES de crear la línea
             if vals.get('create_new_service') and vals.get('residue_name') and not vals.get('product_id'):
-                _logger.info("create(): Creando producto para residue_name='%s'", vals.get('residue_name'))
-                
-                # Buscar producto existente primero
-                Product = self.env['product.product'].sudo()
-                existing = Product.search([('name', '=', vals['residue_name'])], limit=1)
-                
-                if existing:
-                    vals['product_id'] = existing.id
-                    _logger.info("create(): Producto existente encontrado: %s", existing.id)
-                else:
-                    # Crear el producto
-                    Category = self.env['product.category'].sudo()
-                    category = Category.search([('name', 'ilike', 'servicios de residuos')], limit=1)
-                    if not category:
-                        category = Category.create({'name': 'Servicios de Residuos'})
-                    
-                    product_vals = {
-                        'name': vals['residue_name'],
-                        'type': 'service',
-                        'categ_id': category.id,
-                        'sale_ok': True,
-                        'purchase_ok': False,
-                    }
-                    if uom_service:
-                        product_vals['uom_id'] = uom_service.id
-                        if 'uom_po_id' in Product._fields:
-                            product_vals['uom_po_id'] = uom_service.id
-                    
-                    try:
-                        new_product = Product.create(product_vals)
-                        vals['product_id'] = new_product.id
-                        _logger.info("create(): Producto creado: %s (ID: %s)", new_product.name, new_product.id)
-                    except Exception as e:
-                        _logger.error("create(): Error creando producto: %s", e)
-            
-            # Asegurar descripción
-            if vals.get('product_id') and not vals.get('name'):
-                product = self.env['product.product'].browse(vals['product_id'])
-                if product.exists():
-                    vals['name'] = product.name
+                product = products_by_name.get(vals['residue_name'])
+                if product:
+                    vals['product_id'] = product.id
+
+        # Asegurar descripción (una sola lectura de nombres)
+        Product = self.env['product.product']
+        product_ids = {vals['product_id'] for vals in vals_list if vals.get('product_id') and not vals.get('name')}
+        product_names = {product.id: product.name for product in Product.browse(product_ids).exists()}
+        for vals in vals_list:
+            if vals.get('product_id') and not vals.get('name') and vals['product_id'] in product_names:
+                vals['name'] = product_names[vals['product_id']]
 
         lines = super().create(vals_list)
 
-        for line in lines:
-            # 1. Crear Embalaje si hace falta
-            if line.create_new_packaging and line.packaging_name:
-                line._create_or_update_packaging_v19(line)
-
-            # 2. Verificación de seguridad: si aún no hay producto, intentar crearlo
-            if line.create_new_service and not line.product_id and line.residue_name:
-                _logger.warning("create() post: Línea %s sin product_id, reintentando...", line.id)
-                service = line._create_service_product()
-                if service:
-                    line.write({
-                        'product_id': service.id,
-                        'name': service.name,
-                        'product_uom_id': service.uom_id.id if service.uom_id else False,
-                    })
+        # 1. Crear Embalajes si hace falta (por lotes)
+        lines._create_or_update_packaging_batch()
+
+        # 2. Verificación de seguridad: si aún no hay producto, intentar crearlo (por lotes)
+        lines._assign_missing_service_products(service_uom=uom_service, update_uom=True)
 
         return lines
 
     def write(self, vals):
         res = super().write(vals)
-        
-        for line in self:
-            # Embalaje
-            if 'create_new_packaging' in vals or 'packaging_name' in vals:
-                line._create_or_update_packaging_v19(line)
-
-            # CORRECCIÓN: Crear producto si falta después de write
-            if line.create_new_service and line.residue_name and not line.product_id:
-                _logger.info("write(): Línea %s sin product_id, creando...", line.id)
-                service = line._create_service_product()
-                if service:
-                    # Usar SQL directo para evitar recursión
-                    self.env.cr.execute("""
-                        UPDATE sale_order_line 
-                        SET product_id = %s, name = %s
-                        WHERE id = %s
-                    """, (service.id, service.name, line.id))
-                    line.invalidate_recordset(['product_id', 'name'])
-                    
-        return res
\ No newline at end of file
+        if self.env.context.get('skip_residue_line_sync'):
+            return res
+
+        # Embalaje (por lotes)
+        if 'create_new_packaging' in vals or 'packaging_name' in vals:
+            self._create_or_update_packaging_batch()
+
+        # CORRECCIÓN: Crear producto si falta después de write (solo si cambió algo relevante)
+        if any(fname in vals for fname in self._RESIDUE_PRODUCT_TRIGGER_FIELDS):
+            self._assign_missing_service_products()
+
+        return res
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+# Bloques de texto del prospecto que viven en el perfil (no en sale_order)
+PROSPECT_PROFILE_FIELDS = (
+    # INFORMACIÓN OPERATIVA
+    'access_restrictions',
+    'allowed_collection_schedules',
+    'current_container_types',
+    'special_handling_conditions',
+    'seasonality',
+
+    # INFORMACIÓN REGULATORIA
+    'environmental_authorizations',
+    'quality_certifications',
+    'other_relevant_permits',
+
+    # COMPETENCIA Y MERCADO
+    'reason_for_new_provider',
+
+    # REQUERIMIENTOS ESPECIALES
+    'specific_certificates_needed',
+    'reporting_requirements',
+
+    # CAMPOS DE SEGUIMIENTO
+    'pending_actions',
+    'conversation_notes',
+)
+
+
+class SaleProspectProfile(models.Model):
+    _name = 'sale.prospect.profile'
+    _description = 'Perfil del Prospecto (CRM)'
+
+    lead_id = fields.Many2one(
+        'crm.lead',
+        string='Oportunidad',
+        ondelete='set null',
+        index='btree_not_null',
+        copy=False,
+        help='Oportunidad de origen. Solo el perfil canónico del lead la tiene; las copias editadas en una cotización no.'
+    )
+    partner_id = fields.Many2one('res.partner', string='Cliente', ondelete='set null')
+    order_ids = fields.One2many('sale.order', 'prospect_profile_id', string='Cotizaciones')
+
+    # INFORMACIÓN OPERATIVA
+    access_restrictions = fields.Text(string="Restricciones de Acceso")
+    allowed_collection_schedules = fields.Text(string="Horarios Permitidos para Recolección")
+    current_container_types = fields.Text(string="Tipo de Contenedores Actuales")
+    special_handling_conditions = fields.Text(string="Condiciones Especiales de Manejo")
+    seasonality = fields.Text(string="Estacionalidad")
+
+    # INFORMACIÓN REGULATORIA
+    environmental_authorizations = fields.Text(string="Autorizaciones Ambientales Vigentes")
+    quality_certifications = fields.Text(string="Certificaciones de Calidad")
+    other_relevant_permits = fields.Text(string="Otros Permisos Relevantes")
+
+    # COMPETENCIA Y MERCADO
+    reason_for_new_provider = fields.Text(string="Motivo de Búsqueda de Nuevo Proveedor")
+
+    # REQUERIMIENTOS ESPECIALES
+    specific_certificates_needed = fields.Text(string="Necesidad de Certificados Específicos")
+    reporting_requirements = fields.Text(string="Requerimientos de Reporteo")
+
+    # CAMPOS DE SEGUIMIENTO
+    pending_actions = fields.Text(string="Acciones Pendientes")
+    conversation_notes = fields.Text(string="Notas de Conversaciones")
+
+    @api.depends('lead_id', 'partner_id')
+    def _compute_display_name(self):
+        for profile in self:
+            profile.display_name = profile.lead_id.name or profile.partner_id.name or f'Perfil #{profile.id}'
+
+    # -------------------------------------------------------------------------
+    # HELPERS
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_or_create_for_leads(self, leads):
+        """
+        Perfil canónico de cada lead (uno por lead) con sus valores actuales.
+        Si el lead cambió, NO se reescribe el perfil en su lugar: se crea un
+        canónico nuevo y solo las cotizaciones abiertas (draft/sent) que usaban
+        el anterior pasan al nuevo; las confirmadas o canceladas conservan el
+        anterior como instantánea. Un read de los leads, una búsqueda de
+        perfiles y un solo create(). Devuelve {lead_id: profile}.
+        """
+        if not leads:
+            return {}
+
+        lead_fnames = [fname for fname in PROSPECT_PROFILE_FIELDS if fname in leads._fields]
+        rows = leads.read(lead_fnames + ['partner_id'])
+
+        profiles = {}
+        for profile in self.search([('lead_id', 'in', leads.ids)]):
+            profiles.setdefault(profile.lead_id.id, profile)
+
+        vals_list = []
+        stale_lead_by_profile = {}
+        for row in rows:
+            vals = {fname: row.get(fname) or False for fname in PROSPECT_PROFILE_FIELDS}
+            profile = profiles.get(row['id'])
+            if profile:
+                if all(profile[fname] == value for fname, value in vals.items()):
+                    continue
+                stale_lead_by_profile[profile.id] = row['id']
+            vals['lead_id'] = row['id']
+            vals['partner_id'] = row['partner_id'] and row['partner_id'][0]
+            vals_list.append(vals)
+
+        stale = self.browse(list(stale_lead_by_profile))
+        # El anterior deja de ser canónico: queda como instantánea de sus órdenes
+        stale.write({'lead_id': False})
+        for profile in self.create(vals_list):
+            profiles[profile.lead_id.id] = profile
+
+        if stale:
+            open_orders = self.env['sale.order'].search([
+                ('prospect_profile_id', 'in', stale.ids),
+                ('state', 'in', ('draft', 'sent')),
+            ])
+            for old in stale:
+                orders = open_orders.filtered(lambda o: o.prospect_profile_id == old)
+                if orders:
+                    orders.write({'prospect_profile_id': profiles[stale_lead_by_profile[old.id]].id})
+            stale.filtered(lambda p: not p.order_ids).unlink()
+        return profiles
+
+    def _is_shared_with_others(self, order):
+        """True si el perfil es el canónico del lead o lo usa otra cotización."""
+        self.ensure_one()
+        if self.lead_id:
+            return True
+        return bool(self.env['sale.order'].search_count(
+            [('prospect_profile_id', '=', self.id), ('id', '!=', order.id)], limit=1
+        ))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class SaleResidueReport(models.Model):
+    """
+    Datamart regulatorio: residuos de órdenes confirmadas agregados por cliente,
+    mes, tipo de manejo, plan de manejo, destino final y compañía.
+    Vista materializada (una fila por combinación) refrescada por cron.
+    """
+    _name = 'sale.residue.report'
+    _description = 'Reporte Regulatorio de Residuos'
+    _auto = False
+    _order = 'period desc, partner_id'
+
+    period = fields.Date(string='Periodo', readonly=True)
+    year = fields.Integer(string='Año', readonly=True, aggregator=None)
+    partner_id = fields.Many2one('res.partner', string='Cliente', readonly=True)
+    residue_type = fields.Selection(
+        selection=lambda self: self.env['sale.order.line']._fields['residue_type']._description_selection(self.env),
+        string='Tipo de manejo', readonly=True,
+    )
+    plan_manejo = fields.Selection(
+        selection=lambda self: self.env['sale.order.line']._fields['plan_manejo']._description_selection(self.env),
+        string='Plan de Manejo', readonly=True,
+    )
+    final_destination_id = fields.Many2one('res.partner', string='Destino Final', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    weight_kg = fields.Float(string='Peso (kg)', readonly=True, aggregator='sum')
+    volume = fields.Float(string='Unidades', readonly=True, aggregator='sum')
+    line_count = fields.Integer(string='Líneas', readonly=True, aggregator='sum')
+    order_count = fields.Integer(string='Órdenes', readonly=True, aggregator='sum')
+
+    # -------------------------------------------------------------------------
+    # VISTA MATERIALIZADA
+    # -------------------------------------------------------------------------
+    def _query(self):
+        # id = menor línea del grupo: estable y único (requerido por REFRESH CONCURRENTLY)
+        return """
+            SELECT MIN(sol.id) AS id,
+                   date_trunc('month', so.date_order)::date AS period,
+                   EXTRACT(YEAR FROM so.date_order)::int AS year,
+                   partner.commercial_partner_id AS partner_id,
+                   sol.residue_type AS residue_type,
+                   sol.plan_manejo AS plan_manejo,
+                   so.final_destination_id AS final_destination_id,
+                   so.company_id AS company_id,
+                   SUM(COALESCE(sol.residue_weight_kg, 0)) AS weight_kg,
+                   SUM(COALESCE(sol.residue_volume, 0)) AS volume,
+                   COUNT(*) AS line_count,
+                   COUNT(DISTINCT so.id) AS order_count
+              FROM sale_order_line sol
+              JOIN sale_order so ON so.id = sol.order_id
+              JOIN res_partner partner ON partner.id = so.partner_id
+             WHERE so.state = 'sale'
+               AND sol.display_type IS NULL
+          GROUP BY date_trunc('month', so.date_order)::date,
+                   EXTRACT(YEAR FROM so.date_order)::int,
+                   partner.commercial_partner_id,
+                   sol.residue_type,
+                   sol.plan_manejo,
+                   so.final_destination_id,
+                   so.company_id
+        """
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute(f"DROP MATERIALIZED VIEW IF EXISTS {self._table} CASCADE")
+        cr.execute(f"CREATE MATERIALIZED VIEW {self._table} AS ({self._query()})")
+        cr.execute(f"CREATE UNIQUE INDEX {self._table}_id_uniq ON {self._table} (id)")
+        cr.execute(f"CREATE INDEX {self._table}_year_plan_idx ON {self._table} (year, plan_manejo, residue_type)")
+        cr.execute(f"CREATE INDEX {self._table}_partner_period_idx ON {self._table} (partner_id, period)")
+
+    @api.model
+    def _refresh_materialized_view(self):
+        """Recalcula la vista sin bloquear lecturas (índice único sobre id)."""
+        self.env.flush_all()
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh(self):
+        self._refresh_materialized_view()
+        _logger.info("sale.residue.report: vista materializada actualizada")
+
+    def action_refresh(self):
+        self._refresh_materialized_view()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
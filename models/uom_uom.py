@@ -0,0 +1,39 @@
+from odoo import models, api
+
+SERVICE_UOM_NAME = 'Unidad de servicio'
+
+
+class UomUom(models.Model):
+    _inherit = 'uom.uom'
+
+    # -------------------------------------------------------------------------
+    # INVALIDACIÓN DEL CACHE DE 'Unidad de servicio'
+    # -------------------------------------------------------------------------
+    @api.model
+    def _is_service_uom_name(self, name):
+        """True si el nombre coincide (ilike) con la UoM de servicio."""
+        return isinstance(name, str) and SERVICE_UOM_NAME.lower() in name.lower()
+
+    def _clear_service_uom_cache(self, names):
+        """Limpia el ormcache de sale.order.line solo si alguna UoM afectada es la de servicio."""
+        if any(self._is_service_uom_name(name) for name in names):
+            self.env.registry.clear_cache()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._clear_service_uom_cache(records.mapped('name'))
+        return records
+
+    def write(self, vals):
+        names = self.mapped('name') if ('name' in vals or 'active' in vals) else []
+        res = super().write(vals)
+        if names:
+            self._clear_service_uom_cache(names + [vals.get('name')])
+        return res
+
+    def unlink(self):
+        names = self.mapped('name')
+        res = super().unlink()
+        self._clear_service_uom_cache(names)
+        return res
@@ -0,0 +1,8 @@
+from . import test_bulk_conversion
+from . import test_collection_events
+from . import test_crm_propagation
+from . import test_instrumentation
+from . import test_performance
+from . import test_residue_import
+from . import test_residue_report
+from . import test_residue_wizard
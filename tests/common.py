@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from contextlib import contextmanager
+
+from odoo.tests import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+
+class SaleCrmPropagateCommon(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({'name': 'Cliente Residuos'})
+        cls.pickup = cls.env['res.partner'].create({
+            'name': 'Planta Norte',
+            'parent_id': cls.partner.id,
+            'type': 'delivery',
+            'street': 'Av. Industrial 100',
+            'city': 'Monterrey',
+        })
+        cls.destination = cls.env['res.partner'].create({'name': 'Relleno Sanitario Sur', 'city': 'Saltillo'})
+
+    # -------------------------------------------------------------------------
+    # FIXTURES
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _residue_vals(cls, index, **overrides):
+        vals = {
+            'name': f'Residuo {index}',
+            'create_new_service': True,
+            'residue_type': ('rsu', 'rme', 'rp')[index % 3],
+            'plan_manejo': 'reciclaje',
+            'create_new_packaging': True,
+            'packaging_name': 'Tambor' if index % 2 else 'Tote',
+            'capacity': '200 L',
+            'weight_kg': 10.0 * (index + 1),
+            'volume': 2.0,
+        }
+        vals.update(overrides)
+        return vals
+
+    @classmethod
+    def _create_lead(cls, residue_count=0, **overrides):
+        vals = {
+            'name': 'Oportunidad Residuos',
+            'type': 'opportunity',
+            'partner_id': cls.partner.id,
+            'service_frequency': 'mensual',
+            'pickup_location_id': cls.pickup.id,
+            'final_destination_id': cls.destination.id,
+            'company_size': 'mediana',
+            'industrial_sector': 'Automotriz',
+            'estimated_budget': 1500.0,
+            'access_restrictions': 'Ingreso con EPP',
+            'conversation_notes': 'Cliente interesado en reciclaje.',
+            'residue_line_ids': [(0, 0, cls._residue_vals(i)) for i in range(residue_count)],
+        }
+        vals.update(overrides)
+        return cls.env['crm.lead'].create(vals)
+
+    def _create_quotation(self, lead, **overrides):
+        vals = {'partner_id': lead.partner_id.id, 'opportunity_id': lead.id}
+        vals.update(overrides)
+        return self.env['sale.order'].create(vals)
+
+    # -------------------------------------------------------------------------
+    # MEDICIÓN
+    # -------------------------------------------------------------------------
+    @contextmanager
+    def _measure(self, label):
+        """Cuenta consultas SQL y tiempo de pared del bloque (con flush incluido)."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        stats = {}
+        start_queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        yield stats
+        self.env.flush_all()
+        stats['queries'] = self.env.cr.sql_log_count - start_queries
+        stats['seconds'] = time.perf_counter() - start
+        _logger.info("%s: %s consultas, %.3fs", label, stats['queries'], stats['seconds'])
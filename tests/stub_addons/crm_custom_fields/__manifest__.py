@@ -0,0 +1,18 @@
+# Stub mínimo de crm_custom_fields para correr las pruebas de sale_crm_propagate
+# en una base local sin el módulo real. Uso:
+#   odoo-bin --addons-path=...,sale_crm_propagate/tests/stub_addons \
+#            -i sale_crm_propagate --test-tags /sale_crm_propagate
+{
+    'name': 'CRM Custom Fields (stub de pruebas)',
+    'version': '19.0.0.0.1',
+    'category': 'Hidden',
+    'summary': 'Campos de crm.lead y crm.lead.residue usados por sale_crm_propagate',
+    'depends': ['crm', 'product', 'uom'],
+    'data': [
+        'security/ir.model.access.csv',
+    ],
+    'installable': True,
+    'application': False,
+    'auto_install': False,
+    'license': 'LGPL-3',
+}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+
+class CrmLead(models.Model):
+    _inherit = 'crm.lead'
+
+    service_frequency = fields.Selection([
+        ('semanal', 'Semanal'),
+        ('quincenal', 'Quincenal'),
+        ('mensual', 'Mensual'),
+        ('bimestral', 'Bimestral'),
+        ('trimestral', 'Trimestral'),
+        ('semestral', 'Semestral'),
+        ('anual', 'Anual'),
+        ('unica', 'Única vez'),
+    ], string='Frecuencia del Servicio')
+    residue_new = fields.Boolean(string='¿Residuo Nuevo?')
+    requiere_visita = fields.Boolean(string='Requiere visita presencial')
+    pickup_location_id = fields.Many2one('res.partner', string='Ubicación de recolección')
+    final_destination_id = fields.Many2one('res.partner', string='Destino final')
+
+    company_size = fields.Selection([
+        ('micro', 'Micro'), ('pequena', 'Pequeña'), ('mediana', 'Mediana'), ('grande', 'Grande'),
+    ], string="Tamaño de Empresa")
+    industrial_sector = fields.Char(string="Giro Industrial/Actividad Económica")
+    prospect_priority = fields.Selection([
+        ('baja', 'Baja'), ('media', 'Media'), ('alta', 'Alta'), ('estrategico', 'Estratégico'),
+    ], string="Prioridad del Prospecto")
+    estimated_business_potential = fields.Float(string="Potencial Estimado de Negocio")
+
+    access_restrictions = fields.Text(string="Restricciones de Acceso")
+    allowed_collection_schedules = fields.Text(string="Horarios Permitidos para Recolección")
+    current_container_types = fields.Text(string="Tipo de Contenedores Actuales")
+    special_handling_conditions = fields.Text(string="Condiciones Especiales de Manejo")
+    seasonality = fields.Text(string="Estacionalidad")
+
+    waste_generator_registration = fields.Char(string="Registro como Generador de Residuos")
+    environmental_authorizations = fields.Text(string="Autorizaciones Ambientales Vigentes")
+    quality_certifications = fields.Text(string="Certificaciones de Calidad")
+    other_relevant_permits = fields.Text(string="Otros Permisos Relevantes")
+
+    current_service_provider = fields.Char(string="Proveedor Actual de Servicios")
+    current_costs = fields.Float(string="Costos Actuales")
+    current_provider_satisfaction = fields.Selection([
+        ('muy_bajo', 'Muy Bajo'), ('bajo', 'Bajo'), ('medio', 'Medio'), ('alto', 'Alto'), ('muy_alto', 'Muy Alto'),
+    ], string="Nivel de Satisfacción con Proveedor Actual")
+    reason_for_new_provider = fields.Text(string="Motivo de Búsqueda de Nuevo Proveedor")
+
+    specific_certificates_needed = fields.Text(string="Necesidad de Certificados Específicos")
+    reporting_requirements = fields.Text(string="Requerimientos de Reporteo")
+    service_urgency = fields.Selection([
+        ('inmediata', 'Inmediata'), ('1_semana', '1 Semana'), ('1_mes', '1 Mes'),
+        ('3_meses', '3 Meses'), ('sin_prisa', 'Sin Prisa'),
+    ], string="Urgencia del Servicio")
+    estimated_budget = fields.Float(string="Presupuesto Estimado")
+
+    next_contact_date = fields.Datetime(string="Fecha de Próximo Contacto")
+    pending_actions = fields.Text(string="Acciones Pendientes")
+    conversation_notes = fields.Text(string="Notas de Conversaciones")
+
+    residue_line_ids = fields.One2many('crm.lead.residue', 'lead_id', string='Residuos')
+
+
+class CrmLeadResidue(models.Model):
+    _name = 'crm.lead.residue'
+    _description = 'Residuo del Lead (stub)'
+
+    lead_id = fields.Many2one('crm.lead', required=True, ondelete='cascade', index=True)
+    name = fields.Char(string='Residuo', required=True)
+    product_id = fields.Many2one('product.product', string='Producto')
+    create_new_service = fields.Boolean(default=True)
+    existing_service_id = fields.Many2one('product.product')
+    residue_type = fields.Selection([('rsu', 'RSU'), ('rme', 'RME'), ('rp', 'RP')])
+    plan_manejo = fields.Selection([
+        ('reciclaje', 'Reciclaje'),
+        ('aprovechamiento_energetico', 'Aprovechamiento Energético'),
+        ('relleno_sanitario', 'Relleno Sanitario'),
+        ('coprocesamiento', 'Co-procesamiento'),
+        ('tratamiento_fisicoquimico', 'Tratamiento Físico-Químico'),
+        ('tratamiento_biologico', 'Tratamiento Biológico'),
+        ('tratamiento_termico', 'Tratamiento Térmico'),
+        ('confinamiento_controlado', 'Confinamiento Controlado'),
+        ('reutilizacion', 'Reutilización'),
+        ('destruccion_fiscal', 'Destrucción Fiscal'),
+    ])
+    create_new_packaging = fields.Boolean()
+    packaging_name = fields.Char()
+    packaging_id = fields.Many2one('uom.uom')
+    capacity = fields.Char()
+    weight_kg = fields.Float()
+    volume = fields.Float(default=1.0)
+    weight_per_unit = fields.Float(compute='_compute_weight_per_unit', store=True)
+    uom_id = fields.Many2one('uom.uom')
+
+    @api.depends('weight_kg', 'volume')
+    def _compute_weight_per_unit(self):
+        for residue in self:
+            residue.weight_per_unit = (residue.weight_kg / residue.volume) if residue.volume else 0.0
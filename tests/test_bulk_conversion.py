@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBulkConversion(SaleCrmPropagateCommon):
+
+    def test_bulk_conversion_in_batches(self):
+        leads = self.env['crm.lead'].concat(*(
+            self._create_lead(residue_count=2, name=f'Lead {i}') for i in range(25)
+        ))
+        without_partner = self._create_lead(partner_id=False, name='Sin cliente')
+
+        orders, skipped = (leads | without_partner)._create_quotations_in_batches(batch_size=10)
+
+        self.assertEqual(len(orders), 25)
+        self.assertEqual(skipped, without_partner)
+        self.assertEqual(orders.opportunity_id, leads)
+        self.assertTrue(all(len(order.order_line) == 2 for order in orders))
+
+        # Re-ejecutar no duplica cotizaciones
+        orders_again, skipped_again = leads._create_quotations_in_batches(batch_size=10)
+        self.assertFalse(orders_again)
+        self.assertEqual(skipped_again, leads)
+
+    def test_bulk_action_returns_notification(self):
+        lead = self._create_lead(residue_count=1)
+        action = lead.action_create_quotations_bulk()
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertEqual(len(lead.order_ids), 1)
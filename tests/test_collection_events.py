@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCollectionEvents(SaleCrmPropagateCommon):
+
+    def _confirmed_order(self, **overrides):
+        order = self._create_quotation(self._create_lead(residue_count=1), **overrides)
+        order.action_confirm()
+        return order
+
+    def _active_dates(self, order):
+        return order.collection_event_ids.filtered(lambda e: e.state != 'cancel').mapped('scheduled_date')
+
+    def test_events_generated_until_expiration(self):
+        today = fields.Date.context_today(self.env['sale.order'])
+        order = self._confirmed_order(expiration_date=today + timedelta(days=70))
+        dates = self._active_dates(order)
+
+        self.assertEqual(dates[0], order.date_order.date())
+        self.assertEqual(len(dates), 3)
+        self.assertEqual(order.collection_horizon_date, order.expiration_date)
+
+        # El cron no vuelve a generar lo ya generado
+        self.env['sale.order']._cron_extend_collection_horizons()
+        self.assertEqual(self._active_dates(order), dates)
+
+    def _confirmed_order_with_frequency(self, frequency, **overrides):
+        # service_frequency llega del lead: un override en la cotización se pisa
+        lead = self._create_lead(residue_count=1, service_frequency=frequency)
+        order = self._create_quotation(lead, **overrides)
+        order.action_confirm()
+        return order
+
+    def test_cron_only_extends_rolling_horizon(self):
+        order = self._confirmed_order_with_frequency('semanal', expiration_date=False)
+        dates = self._active_dates(order)
+        self.assertTrue(dates)
+        self.assertEqual(order.service_frequency, 'semanal')
+
+        with patch.object(type(order), '_COLLECTION_HORIZON_DAYS', 180):
+            self.env['sale.order']._cron_extend_collection_horizons()
+        extended = self._active_dates(order)
+        self.assertEqual(extended[:len(dates)], dates)
+        self.assertGreater(len(extended), len(dates))
+        self.assertEqual(len(extended), len(set(extended)))
+        self.assertTrue(all((b - a).days == 7 for a, b in zip(extended, extended[1:])))
+
+    def test_frequency_change_and_cancel(self):
+        order = self._confirmed_order()
+        first = order.collection_event_ids[0]
+
+        order.service_frequency = 'quincenal'
+        dates = self._active_dates(order)
+        self.assertIn(first, order.collection_event_ids)
+        self.assertTrue(all((b - a).days == 14 for a, b in zip(dates[1:], dates[2:])))
+
+        order._action_cancel()
+        self.assertEqual(set(order.collection_event_ids.mapped('state')), {'cancel'})
+        self.assertFalse(order.collection_horizon_date)
+
+    def test_long_expiration_is_generated_in_windows(self):
+        today = fields.Date.context_today(self.env['sale.order'])
+        order = self._confirmed_order_with_frequency('semanal', expiration_date=today + timedelta(days=400))
+        window = timedelta(days=order._COLLECTION_HORIZON_DAYS)
+        self.assertEqual(order.collection_horizon_date, today + window)
+        self.assertLessEqual(self._active_dates(order)[-1], today + window)
+
+        with patch.object(type(order), '_COLLECTION_HORIZON_DAYS', 500):
+            self.env['sale.order']._cron_extend_collection_horizons()
+        self.assertEqual(order.collection_horizon_date, order.expiration_date)
+        self.assertLessEqual(self._active_dates(order)[-1], order.expiration_date)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCrmPropagation(SaleCrmPropagateCommon):
+
+    def test_propagation_copies_mapped_fields_and_lines(self):
+        lead = self._create_lead(residue_count=3)
+        order = self._create_quotation(lead)
+
+        self.assertEqual(order.service_frequency, 'mensual')
+        self.assertEqual(order.pickup_location_id, self.pickup)
+        self.assertTrue(order.pickup_location_manual)
+        self.assertEqual(order.final_destination_id, self.destination)
+        self.assertEqual(order.company_size, 'mediana')
+        self.assertEqual(order.estimated_budget, 1500.0)
+        self.assertEqual(order.access_restrictions, 'Ingreso con EPP')
+        self.assertEqual(len(order.order_line), 3)
+        self.assertEqual(order.order_line.crm_residue_id, lead.residue_line_ids)
+        self.assertTrue(all(order.order_line.mapped('product_id')))
+
+    def test_batch_create_keeps_leads_apart(self):
+        leads = self.env['crm.lead'].concat(*(
+            self._create_lead(residue_count=i + 1, name=f'Lead {i}') for i in range(4)
+        ))
+        orders = self.env['sale.order'].create([
+            {'partner_id': self.partner.id, 'opportunity_id': lead.id} for lead in leads
+        ])
+        self.assertEqual([len(order.order_line) for order in orders], [1, 2, 3, 4])
+        for order, lead in zip(orders, leads):
+            self.assertEqual(order.order_line.crm_residue_id, lead.residue_line_ids)
+
+    def test_related_quotation_defaults_use_mapping(self):
+        order = self._create_quotation(self._create_lead())
+        context = order.action_create_related_quotation()['context']
+        self.assertEqual(context['default_related_quotation_id'], order.id)
+        self.assertEqual(context['default_service_frequency'], 'mensual')
+        self.assertEqual(context['default_pickup_location_id'], self.pickup.id)
+        self.assertEqual(context['default_company_size'], 'mediana')
+        self.assertNotIn('default_conversation_notes', context)
+
+    def test_prospect_profile_copy_on_write(self):
+        lead = self._create_lead()
+        order_a = self._create_quotation(lead)
+        order_b = self._create_quotation(lead)
+        self.assertEqual(order_a.prospect_profile_id, order_b.prospect_profile_id)
+
+        order_a.conversation_notes = 'Solo para esta cotización'
+        self.assertNotEqual(order_a.prospect_profile_id, order_b.prospect_profile_id)
+        self.assertEqual(order_b.conversation_notes, 'Cliente interesado en reciclaje.')
+        self.assertEqual(order_a.conversation_notes, 'Solo para esta cotización')
+
+    def test_lead_edit_does_not_rewrite_confirmed_orders(self):
+        lead = self._create_lead(residue_count=1)
+        confirmed = self._create_quotation(lead)
+        confirmed.action_confirm()
+        draft = self._create_quotation(lead)
+        old_profile = draft.prospect_profile_id
+
+        lead.conversation_notes = 'Cambió el alcance.'
+        newer = self._create_quotation(lead)
+
+        self.assertNotEqual(newer.prospect_profile_id, old_profile)
+        self.assertEqual(newer.conversation_notes, 'Cambió el alcance.')
+        self.assertEqual(draft.prospect_profile_id, newer.prospect_profile_id)
+        self.assertEqual(confirmed.prospect_profile_id, old_profile)
+        self.assertEqual(confirmed.conversation_notes, 'Cliente interesado en reciclaje.')
+
+    def test_service_products_deduplicated_by_normalized_name(self):
+        lead = self._create_lead(residue_line_ids=[
+            (0, 0, self._residue_vals(0, name='Aceite usado ')),
+            (0, 0, self._residue_vals(1, name='aceite usado')),
+            (0, 0, self._residue_vals(2, name='ACEITE USADÓ')),
+        ])
+        order = self._create_quotation(lead)
+        self.assertEqual(len(order.order_line.product_id), 1)
+
+    def test_packaging_uom_created_once_per_name(self):
+        order = self._create_quotation(self._create_lead(residue_count=6))
+        packagings = order.order_line.residue_packaging_id
+        self.assertEqual(sorted(packagings.mapped('name')), ['Tambor', 'Tote'])
+
+    def test_multi_edit_does_not_touch_products(self):
+        order = self._create_quotation(self._create_lead(residue_count=3))
+        products = order.order_line.mapped('product_id')
+        order.order_line.write({'residue_type': 'rp'})
+        self.assertEqual(order.order_line.mapped('product_id'), products)
+
+    def test_replayed_create_returns_existing_quotation(self):
+        lead = self._create_lead(residue_count=2)
+        SaleOrder = self.env['sale.order']
+        vals = dict(
+            SaleOrder.default_get(['create_request_token']),
+            partner_id=self.partner.id,
+            opportunity_id=lead.id,
+        )
+        order = SaleOrder.create([dict(vals)])
+        replay = SaleOrder.create([dict(vals), {'partner_id': self.partner.id}])
+
+        self.assertEqual(replay[0], order)
+        self.assertNotEqual(replay[1], order)
+        self.assertEqual(SaleOrder.search_count([('opportunity_id', '=', lead.id)]), 1)
+        self.assertEqual(len(order.order_line), 2)
+        # Sin token explícito cada create() es una orden nueva
+        self.assertNotEqual(self._create_quotation(lead), self._create_quotation(lead))
+
+    def test_sync_applies_only_the_delta(self):
+        lead = self._create_lead(residue_count=3)
+        order = self._create_quotation(lead)
+        self.assertFalse(order._sync_from_crm(), "Sin cambios en el lead no hay nada que escribir")
+
+        first, second, third = lead.residue_line_ids
+        first.weight_kg = 999.0
+        third.unlink()
+        lead.write({'residue_line_ids': [(0, 0, self._residue_vals(7))]})
+
+        self.assertEqual(order._sync_from_crm(), order)
+        self.assertEqual(order.order_line.crm_residue_id, lead.residue_line_ids)
+        line = order.order_line.filtered(lambda l: l.crm_residue_id == first)
+        self.assertEqual(line.residue_weight_kg, 999.0)
+        self.assertFalse(order._sync_from_crm())
+
+    def test_sync_respects_manual_pickup(self):
+        lead = self._create_lead()
+        order = self._create_quotation(lead)
+        other = self.env['res.partner'].create({'name': 'Otra planta', 'parent_id': self.partner.id})
+        order.pickup_location_id = other
+        lead.pickup_location_id = self.destination
+        order._sync_from_crm()
+        self.assertEqual(order.pickup_location_id, other)
+
+    def test_sync_updates_untouched_pickup(self):
+        lead = self._create_lead()
+        order = self._create_quotation(lead)
+        other = self.env['res.partner'].create({'name': 'Otra planta', 'parent_id': self.partner.id})
+        lead.write({'pickup_location_id': other.id, 'final_destination_id': self.pickup.id})
+        order._sync_from_crm()
+        self.assertEqual(order.pickup_location_id, other)
+        self.assertEqual(order.final_destination_id, self.pickup)
+        self.assertFalse(order.pickup_location_user_set)
+
+    def test_sync_links_legacy_lines_instead_of_duplicating(self):
+        lead = self._create_lead(residue_count=3)
+        order = self._create_quotation(lead)
+        order.order_line.write({'crm_residue_id': False, 'crm_propagated': False, 'crm_residue_hash': False})
+
+        order._sync_from_crm()
+        self.assertEqual(len(order.order_line), 3)
+        self.assertEqual(order.order_line.crm_residue_id, lead.residue_line_ids)
+        self.assertFalse(order._sync_from_crm())
+
+    def test_sync_of_copied_quotation_does_not_duplicate(self):
+        lead = self._create_lead(residue_count=2)
+        copy = self._create_quotation(lead).copy()
+        self.assertEqual(copy.opportunity_id, lead)
+        self.assertFalse(copy._sync_from_crm())
+        self.assertEqual(len(copy.order_line), 2)
+
+    def test_sync_applies_packaging_change(self):
+        lead = self._create_lead(residue_count=1)
+        order = self._create_quotation(lead)
+        lead.residue_line_ids.packaging_name = 'Contenedor'
+
+        self.assertEqual(order._sync_from_crm(), order)
+        self.assertEqual(order.order_line.packaging_name, 'Contenedor')
+        self.assertEqual(order.order_line.residue_packaging_id.name, 'Contenedor')
+        self.assertFalse(order._sync_from_crm())
+
+    def test_cron_sync_picks_up_late_committed_lead(self):
+        lead = self._create_lead(residue_count=1)
+        order = self._create_quotation(lead)
+        ICP = self.env['ir.config_parameter'].sudo()
+        param = self.env['sale.order']._CRM_SYNC_WATERMARK_PARAM
+        # Transacción larga: el lead confirma con un write_date anterior a la marca
+        lead.residue_line_ids.weight_kg = 321.0
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE crm_lead_residue SET write_date = write_date - interval '2 minutes' WHERE lead_id = %s",
+            [lead.id],
+        )
+        self.env.invalidate_all()
+        late_write = lead.residue_line_ids.write_date
+        ICP.set_param(param, fields.Datetime.to_string(late_write + timedelta(minutes=1)))
+
+        self.env['sale.order']._cron_sync_from_crm()
+        self.assertEqual(order.order_line.residue_weight_kg, 321.0)
+        # La marca nunca retrocede
+        self.assertEqual(
+            fields.Datetime.to_datetime(ICP.get_param(param)), late_write + timedelta(minutes=1)
+        )
+
+    def test_quotation_chain(self):
+        root = self._create_quotation(self._create_lead())
+        child = self.env['sale.order'].create({'partner_id': self.partner.id, 'related_quotation_id': root.id})
+        grandchild = self.env['sale.order'].create({'partner_id': self.partner.id, 'related_quotation_id': child.id})
+        self.assertEqual(root.child_quotations_count, 1)
+        self.assertEqual(grandchild._get_quotation_chain(), root | child | grandchild)
+
+    def test_quotation_chain_after_unlinking_middle_node(self):
+        root = self._create_quotation(self._create_lead())
+        child = self.env['sale.order'].create({'partner_id': self.partner.id, 'related_quotation_id': root.id})
+        grandchild = self.env['sale.order'].create({'partner_id': self.partner.id, 'related_quotation_id': child.id})
+        child.unlink()
+        self.assertFalse(grandchild.related_quotation_id)
+        self.assertEqual(grandchild.parent_path, f'{grandchild.id}/')
+        self.assertEqual(grandchild._get_quotation_chain(), grandchild)
+        self.assertEqual(root._get_quotation_chain(), root)
+
+    def test_one_line_addresses(self):
+        order = self._create_quotation(self._create_lead())
+        self.assertIn('Av. Industrial 100', order.pickup_location_address)
+        self.assertIn('Monterrey', order.pickup_location_address)
+        self.assertNotIn('\n', order.pickup_location_address)
+        self.assertIn('Saltillo', order.final_destination_address)
+
+    def test_stored_address_follows_partner(self):
+        order = self._create_quotation(self._create_lead())
+        self.pickup.city = 'San Nicolás'
+        self.assertIn('San Nicolás', order.pickup_location_address)
+        self.assertEqual(
+            self.env['sale.order'].search([('pickup_location_address', 'ilike', 'San Nicolás')]),
+            order,
+        )
+
+    def test_service_frequency_selection_is_cached(self):
+        SaleOrder = self.registry['sale.order']
+        self.env.registry.clear_cache()
+        with patch.object(
+            SaleOrder, '_get_service_frequency_selection', autospec=True, return_value=[('mensual', 'Mensual')],
+        ) as resolver:
+            for _i in range(3):
+                selection = self.env['sale.order'].fields_get(['service_frequency'])['service_frequency']['selection']
+                self.assertEqual([tuple(item) for item in selection], [('mensual', 'Mensual')])
+        self.assertEqual(resolver.call_count, 1)
+        self.env.registry.clear_cache()
+
+    def test_residue_summary_is_stored_per_order(self):
+        order = self._create_quotation(self._create_lead(residue_count=3))
+        self.assertEqual(order.residue_total_weight_kg, 60.0)
+        self.assertEqual(order.residue_total_volume, 6.0)
+        self.assertEqual(
+            (order.residue_weight_rsu_kg, order.residue_weight_rme_kg, order.residue_weight_rp_kg),
+            (10.0, 20.0, 30.0),
+        )
+        self.assertEqual(order.residue_weight_by_plan, {'reciclaje': 60.0})
+
+        order.order_line[2].write({'plan_manejo': 'coprocesamiento', 'residue_weight_kg': 5.0})
+        self.assertEqual(order.residue_total_weight_kg, 35.0)
+        self.assertEqual(order.residue_weight_rp_kg, 5.0)
+        self.assertEqual(order.residue_weight_by_plan, {'reciclaje': 30.0, 'coprocesamiento': 5.0})
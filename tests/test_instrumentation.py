@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from odoo.addons.sale_crm_propagate.models import instrumentation
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestInstrumentation(SaleCrmPropagateCommon):
+
+    def test_request_stats_collected(self):
+        lead = self._create_lead(residue_count=3)
+        stats = instrumentation.get_request_stats(self.env)
+        before = {operation: dict(stats[operation]) for operation in ('propagation', 'service_product', 'service_uom')}
+
+        self._create_quotation(lead)
+
+        self.assertEqual(stats['propagation']['calls'] - before['propagation']['calls'], 1)
+        self.assertEqual(stats['propagation']['created'] - before['propagation']['created'], 4)
+        self.assertEqual(stats['service_product']['created'] - before['service_product']['created'], 3)
+        self.assertGreater(stats['service_uom']['cache_hits'], before['service_uom']['cache_hits'])
+
+    def test_savepoints_do_not_split_request_stats(self):
+        stats = instrumentation.get_request_stats(self.env)
+        calls = stats['propagation']['calls']
+        with self.env.cr.savepoint():
+            self._create_quotation(self._create_lead(residue_count=1))
+        self.assertIs(instrumentation.get_request_stats(self.env), stats)
+        self.assertEqual(stats['propagation']['calls'], calls + 1)
+
+    def test_service_uom_time_and_queries_measured(self):
+        stats = instrumentation.get_request_stats(self.env)['service_uom']
+        calls, seconds = stats['calls'], stats['seconds']
+        self.env['sale.order.line']._get_or_create_service_uom()
+        self.assertEqual(stats['calls'], calls + 1)
+        self.assertGreater(stats['seconds'], seconds)
+
+    def test_flush_hook_only_when_stats_or_debug_enabled(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        postcommit = self.env.cr.postcommit
+        hooks = len(postcommit._funcs)
+        with patch.object(instrumentation._logger, 'isEnabledFor', return_value=False):
+            ICP.set_param(instrumentation.STATS_ENABLED_PARAM, False)
+            postcommit.data.pop(instrumentation.STATS_KEY, None)
+            instrumentation.get_request_stats(self.env)
+            self.assertEqual(len(postcommit._funcs), hooks)
+
+            ICP.set_param(instrumentation.STATS_ENABLED_PARAM, True)
+            postcommit.data.pop(instrumentation.STATS_KEY, None)
+            instrumentation.get_request_stats(self.env)
+            self.assertEqual(len(postcommit._funcs), hooks + 1)
+
+    def test_stats_are_aggregated_per_day(self):
+        Stat = self.env['sale.crm.propagate.stat']
+        payload = {'propagation': dict.fromkeys(instrumentation.COUNTERS, 1)}
+        Stat._upsert_request_stats(payload)
+        Stat._upsert_request_stats(payload)
+        row = Stat.search([('operation', '=', 'propagation')])
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row.calls, 2)
+        self.assertEqual(row.queries, 2)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install', 'sale_crm_propagate_perf')
+class TestPropagationPerformance(SaleCrmPropagateCommon):
+    """
+    Benchmarks de consultas SQL. Los umbrales no fijan un número exacto
+    (depende de los módulos instalados) sino la escala: el costo por
+    línea/orden no debe crecer con el tamaño del lote.
+    """
+
+    def test_conversion_query_count_by_residue_lines(self):
+        counts = {}
+        for size in (1, 10, 100):
+            lead = self._create_lead(residue_count=size, name=f'Lead {size}')
+            with self._measure(f'Conversión con {size} residuos') as stats:
+                self._create_quotation(lead)
+            counts[size] = stats['queries']
+        # Menos de una consulta por línea adicional: todo va por lotes
+        self.assertLess(counts[100] - counts[1], 99)
+
+    def test_batch_quotation_creation_per_order_flat(self):
+        per_order = {}
+        for size in (10, 100):
+            leads = self.env['crm.lead'].concat(*(
+                self._create_lead(residue_count=3, name=f'Lead {size}-{i}') for i in range(size)
+            ))
+            with self._measure(f'Creación de {size} cotizaciones') as stats:
+                self.env['sale.order'].create([
+                    {'partner_id': self.partner.id, 'opportunity_id': lead.id} for lead in leads
+                ])
+            per_order[size] = stats['queries'] / size
+        self.assertLessEqual(per_order[100], per_order[10] * 1.1 + 1)
+
+    def test_multi_edit_write_over_1000_lines(self):
+        leads = self.env['crm.lead'].concat(*(
+            self._create_lead(residue_count=100, name=f'Lead {i}') for i in range(10)
+        ))
+        orders = self.env['sale.order'].create([
+            {'partner_id': self.partner.id, 'opportunity_id': lead.id} for lead in leads
+        ])
+        lines = orders.order_line
+        self.assertEqual(len(lines), 1000)
+        with self._measure('Edición múltiple de 1000 líneas') as stats:
+            lines.write({'residue_type': 'rp', 'plan_manejo': 'coprocesamiento'})
+        self.assertLess(stats['queries'], 50)
+
+    def test_service_uom_is_cached(self):
+        Line = self.env['sale.order.line']
+        service_uom = Line._get_or_create_service_uom()
+        with self.assertQueryCount(0):
+            for _i in range(500):
+                self.assertEqual(Line._get_or_create_service_uom(), service_uom)
+
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        with self._measure('Creación de 500 líneas') as stats:
+            Line.create([{
+                'order_id': order.id,
+                'create_new_service': True,
+                'residue_name': f'Residuo {i % 5}',
+            } for i in range(500)])
+        self.assertLess(stats['queries'], 500)
+
+    def test_confirm_no_delivery(self):
+        """Latencia de confirmación con 1/50/500 órdenes sin entrega (pedido en user-009)."""
+        product = self.env['product.product'].create({'name': 'Contenedor', 'type': 'consu'})
+        per_order = {}
+        for size in (1, 50, 500):
+            orders = self.env['sale.order'].create([{
+                'partner_id': self.partner.id,
+                'no_delivery': True,
+                'order_line': [(0, 0, {'product_id': product.id, 'product_uom_qty': 1.0})],
+            } for _i in range(size)])
+            with self._measure(f'Confirmación de {size} órdenes sin entrega') as stats:
+                orders.action_confirm()
+            # Ni siquiera se crean albaranes (no basta con que queden cancelados)
+            self.assertFalse(orders.picking_ids)
+            per_order[size] = stats['queries'] / size
+        # Consultas por orden planas; el tiempo de pared solo se registra en el log
+        self.assertLessEqual(per_order[500], per_order[50] * 1.1 + 1)
+        self.assertLessEqual(per_order[50], per_order[1] * 1.1 + 1)
+
+    def test_report_render_per_document_flat(self):
+        per_document = {}
+        for size in (5, 25):
+            orders = self.env['sale.order'].create([{
+                'partner_id': self.partner.id,
+                'pickup_location_id': self.pickup.id,
+                'final_destination_id': self.destination.id,
+                'order_line': [(0, 0, {'create_new_service': True, 'residue_name': f'Residuo {i}'}) for i in range(3)],
+            } for _i in range(size)])
+            with self._measure(f'Render de {size} propuestas') as stats:
+                self.env['ir.actions.report']._render_qweb_html('sale.action_report_saleorder', orders.ids)
+            per_document[size] = stats['queries'] / size
+        self.assertLessEqual(per_document[25], per_document[5] * 1.1 + 1)
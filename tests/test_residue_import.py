@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+from ..wizard import sale_residue_import_wizard
+
+
+@tagged('post_install', '-at_install')
+class TestResidueImport(SaleCrmPropagateCommon):
+
+    def _import(self, order, content, filename):
+        wizard = self.env['sale.residue.import.wizard'].create({
+            'order_id': order.id,
+            'file': base64.b64encode(content),
+            'filename': filename,
+        })
+        wizard.action_import()
+        return wizard
+
+    def test_csv_import_reports_row_errors_and_keeps_valid_rows(self):
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        rows = ['nombre;tipo;plan;capacidad;peso;unidades;embalaje']
+        rows += [f'Residuo {i};RP;Reciclaje;200 L;{i},5;2;Tambor' for i in range(7)]
+        rows += ['Solventes;XYZ;Reciclaje;;1;1;', ';RP;Reciclaje;;1;1;', 'Lodos;RME;Confinamiento Controlado;;abc;1;']
+        content = '\n'.join(rows).encode('latin-1')
+
+        with patch.object(type(self.env['sale.residue.import.wizard']), '_IMPORT_CHUNK_SIZE', 3):
+            wizard = self._import(order, content, 'residuos.csv')
+
+        self.assertEqual(wizard.state, 'done')
+        self.assertEqual(wizard.imported_count, 7)
+        self.assertEqual(wizard.error_count, 3)
+        self.assertIn('Fila 9', wizard.result_message)
+        self.assertEqual(len(order.order_line), 7)
+        self.assertEqual(order.order_line[0].residue_weight_kg, 0.5)
+        self.assertEqual(len(order.order_line.residue_packaging_id), 1)
+        self.assertEqual(len(order.order_line.product_id), 7)
+
+    def test_utf8_detected_across_block_boundary(self):
+        Wizard = self.env['sale.residue.import.wizard']
+        # 'ó' (2 bytes) queda partido entre los bytes 65535 y 65536
+        data = b'a' * 65535 + 'ó'.encode('utf-8')
+        self.assertEqual(Wizard._detect_csv_encoding(data), 'utf-8-sig')
+        self.assertEqual(Wizard._detect_csv_encoding('Cartón'.encode('latin-1')), 'latin-1')
+
+    def test_xlsx_import(self):
+        openpyxl = sale_residue_import_wizard.openpyxl
+        if openpyxl is None:
+            self.skipTest('openpyxl no está instalado')
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Nombre', 'Tipo', 'Plan', 'Capacidad', 'Peso', 'Unidades', 'Embalaje'])
+        sheet.append(['Aceite usado', 'RP', 'Reciclaje', '200 L', 180.5, 4, 'Tambor'])
+        sheet.append(['Cartón', 'RSU', 'Relleno Sanitario', None, 50, 2, None])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        wizard = self._import(order, buffer.getvalue(), 'residuos.xlsx')
+
+        self.assertEqual(wizard.imported_count, 2)
+        self.assertFalse(wizard.result_message)
+        self.assertEqual(order.order_line.mapped('residue_type'), ['rp', 'rsu'])
+        self.assertEqual(order.order_line[0].product_uom_qty, 4)
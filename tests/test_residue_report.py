@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestResidueReport(SaleCrmPropagateCommon):
+
+    def test_report_aggregates_confirmed_orders(self):
+        confirmed = self._create_quotation(self._create_lead(residue_count=3))
+        confirmed.action_confirm()
+        self._create_quotation(self._create_lead(residue_count=3, name='Borrador'))
+
+        Report = self.env['sale.residue.report']
+        Report._refresh_materialized_view()
+
+        rows = Report.search([('partner_id', '=', self.partner.id)])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(sum(rows.mapped('weight_kg')), confirmed.residue_total_weight_kg)
+        self.assertEqual(set(rows.mapped('plan_manejo')), {'reciclaje'})
+        self.assertEqual(rows.final_destination_id, self.destination)
+
+        year = confirmed.date_order.year
+        groups = Report._read_group(
+            [('year', '=', year), ('partner_id', '=', self.partner.id)], ['residue_type'], ['weight_kg:sum'],
+        )
+        self.assertEqual(dict(groups), {'rsu': 10.0, 'rme': 20.0, 'rp': 30.0})
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import SaleCrmPropagateCommon
+
+
+@tagged('post_install', '-at_install')
+class TestResidueWizard(SaleCrmPropagateCommon):
+
+    def _wizard(self, order, text):
+        return self.env['sale.residue.add.wizard'].create({'order_id': order.id, 'residue_text': text})
+
+    def test_add_residues_from_pasted_table(self):
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        text = '\n'.join([
+            'Nombre\tTipo\tPlan\tCapacidad\tPeso\tUnidades\tEmbalaje',
+            'Aceite usado\tRP\tReciclaje\t200 L\t180,5\t4\tTambor',
+            'Cartón\trsu\tRelleno Sanitario\t\t50\t2\t',
+            '',
+            'Lodos;RME;co-procesamiento;1 m3;900;1;Tote',
+        ])
+        self._wizard(order, text).action_add_residues()
+
+        lines = order.order_line
+        self.assertEqual(lines.mapped('residue_name'), ['Aceite usado', 'Cartón', 'Lodos'])
+        self.assertEqual(lines.mapped('residue_type'), ['rp', 'rsu', 'rme'])
+        self.assertEqual(lines.mapped('plan_manejo'), ['reciclaje', 'relleno_sanitario', 'coprocesamiento'])
+        self.assertEqual(lines[0].residue_weight_kg, 180.5)
+        self.assertTrue(all(line.product_id for line in lines))
+        self.assertEqual(lines[0].residue_packaging_id.name, 'Tambor')
+        self.assertFalse(lines[1].residue_packaging_id)
+
+    def test_invalid_rows_abort_without_creating_lines(self):
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        text = 'Aceite usado\tRP\tReciclaje\t\t10\t1\nSolventes\tXYZ\tReciclaje\t\t10\t1\n\tRP\t\t\t1\t1'
+        with self.assertRaises(UserError) as error:
+            self._wizard(order, text).action_add_residues()
+        self.assertIn('Fila 2', str(error.exception))
+        self.assertIn('Fila 3', str(error.exception))
+        self.assertFalse(order.order_line)
+
+    def test_onchange_does_not_search_service_uom(self):
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        line = self.env['sale.order.line'].new({'order_id': order.id, 'create_new_service': True})
+        line._onchange_residue_service()
+        with self.assertQueryCount(0):
+            line.residue_name = 'Aceite usado'
+            line._onchange_residue_service()
+        self.assertEqual(line.name, 'Aceite usado')
+        self.assertTrue(line.product_uom_id)
+
+    def test_residue_name_keeps_product_of_regular_line(self):
+        product = self.env['product.product'].create({'name': 'Servicio de recolección', 'type': 'service'})
+        order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        line = self.env['sale.order.line'].create({'order_id': order.id, 'product_id': product.id})
+        form_line = line.new(origin=line)
+        form_line.residue_name = 'Aceite usado'
+        form_line._onchange_residue_service()
+        self.assertEqual(form_line.product_id, product)
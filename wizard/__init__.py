@@ -0,0 +1,3 @@
+from . import sale_residue_row_mixin
+from . import sale_residue_add_wizard
+from . import sale_residue_import_wizard
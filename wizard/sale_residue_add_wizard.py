@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+
+class SaleResidueAddWizard(models.TransientModel):
+    _name = 'sale.residue.add.wizard'
+    _inherit = ['sale.residue.row.mixin']
+    _description = 'Agregar residuos a la cotización'
+
+    order_id = fields.Many2one('sale.order', string='Cotización', required=True, ondelete='cascade')
+    residue_text = fields.Text(
+        string='Residuos',
+        help='Una fila por residuo: nombre, tipo, plan de manejo, capacidad, peso (kg), unidades, embalaje. '
+             'Columnas separadas por tabulador (copiado de Excel), punto y coma o coma.'
+    )
+
+    def _iter_residue_text_rows(self):
+        """(número de fila, celdas) de cada renglón no vacío del texto pegado."""
+        for row_number, text in enumerate((self.residue_text or '').splitlines(), start=1):
+            if not text.strip():
+                continue
+            separator = '\t' if '\t' in text else ';' if ';' in text else ','
+            yield row_number, text.split(separator)
+
+    def action_add_residues(self):
+        """Crea todas las líneas en un solo create(); ninguna si alguna fila es inválida."""
+        self.ensure_one()
+        if self.order_id.state not in ('draft', 'sent'):
+            raise UserError(_('Solo se pueden agregar residuos a cotizaciones en borrador o enviadas.'))
+
+        maps = self._get_residue_selection_maps()
+        vals_list, errors = [], []
+        first = True
+        for row_number, row in self._iter_residue_text_rows():
+            if first and self._is_residue_header_row(row):
+                first = False
+                continue
+            first = False
+            vals, error = self._parse_residue_row(row, maps)
+            if error:
+                errors.append(_('Fila %(row)s: %(error)s', row=row_number, error=error))
+                continue
+            vals['order_id'] = self.order_id.id
+            vals_list.append(vals)
+
+        if errors:
+            raise UserError(_('No se agregó ningún residuo:\n%s', '\n'.join(errors)))
+        if not vals_list:
+            raise UserError(_('Pegue al menos una fila de residuos.'))
+
+        self.env['sale.order.line'].create(vals_list)
+        return {'type': 'ir.actions.act_window_close'}
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import base64
+import codecs
+import csv
+import io
+import logging
+import zipfile
+
+import psycopg2
+
+from odoo import models, fields, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..models import instrumentation
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class SaleResidueImportWizard(models.TransientModel):
+    _name = 'sale.residue.import.wizard'
+    _inherit = ['sale.residue.row.mixin']
+    _description = 'Importar residuos a la cotización'
+
+    # Líneas por create(): productos y embalajes se resuelven por lote
+    _IMPORT_CHUNK_SIZE = 500
+
+    order_id = fields.Many2one('sale.order', string='Cotización', required=True, ondelete='cascade')
+    file = fields.Binary(string='Archivo', attachment=False)
+    filename = fields.Char(string='Nombre del archivo')
+    state = fields.Selection([
+        ('upload', 'Archivo'),
+        ('done', 'Resultado'),
+    ], string='Estado', default='upload', required=True)
+    imported_count = fields.Integer(string='Líneas importadas', readonly=True)
+    error_count = fields.Integer(string='Filas con error', readonly=True)
+    result_message = fields.Text(string='Errores', readonly=True)
+
+    # -------------------------------------------------------------------------
+    # LECTURA DEL ARCHIVO (fila por fila)
+    # -------------------------------------------------------------------------
+    def _is_xlsx_file(self, data):
+        if self.filename:
+            return self.filename.lower().endswith(('.xlsx', '.xlsm'))
+        return data[:2] == b'PK'
+
+    def _iter_file_rows(self):
+        """(número de fila, celdas) del archivo sin cargarlo completo en filas."""
+        data = base64.b64decode(self.file)
+        if self._is_xlsx_file(data):
+            return self._iter_xlsx_rows(data)
+        return self._iter_csv_rows(data)
+
+    def _detect_csv_encoding(self, data):
+        """UTF-8 si todo el archivo lo es (validado por bloques, sin copiarlo); si no, Latin-1."""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for start in range(0, len(data), 65536):
+                decoder.decode(data[start:start + 65536], final=False)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            # Exportaciones de Excel en español suelen venir en Latin-1
+            return 'latin-1'
+        return 'utf-8-sig'
+
+    def _iter_csv_rows(self, data):
+        encoding = self._detect_csv_encoding(data)
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors='replace', newline='')
+        sample = stream.read(4096)
+        stream.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from enumerate(csv.reader(stream, dialect), start=1)
+
+    def _iter_xlsx_rows(self, data):
+        if openpyxl is None:
+            raise UserError(_('Se requiere la librería openpyxl para importar archivos XLSX.'))
+        try:
+            workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        except (zipfile.BadZipFile, KeyError, ValueError, OSError) as e:
+            raise UserError(_('No se pudo leer el archivo XLSX: %s', e)) from e
+        try:
+            yield from enumerate(workbook.worksheets[0].iter_rows(values_only=True), start=1)
+        finally:
+            workbook.close()
+
+    # -------------------------------------------------------------------------
+    # IMPORTACIÓN
+    # -------------------------------------------------------------------------
+    def _create_line_chunk(self, chunk, errors):
+        """Crea un bloque de líneas; si falla, lo reporta y sigue con el resto."""
+        try:
+            with self.env.cr.savepoint():
+                self.env['sale.order.line'].create([vals for row_number, vals in chunk])
+        except (UserError, ValidationError, psycopg2.Error) as e:
+            _logger.warning("Importación de residuos: bloque de filas %s-%s rechazado: %s",
+                            chunk[0][0], chunk[-1][0], e)
+            errors.append(_('Filas %(first)s-%(last)s: %(error)s',
+                            first=chunk[0][0], last=chunk[-1][0], error=e))
+            return 0
+        return len(chunk)
+
+    def action_import(self):
+        self.ensure_one()
+        if not self.file:
+            raise UserError(_('Seleccione un archivo CSV o XLSX.'))
+        if self.order_id.state not in ('draft', 'sent'):
+            raise UserError(_('Solo se pueden agregar residuos a cotizaciones en borrador o enviadas.'))
+
+        maps = self._get_residue_selection_maps()
+        imported, rejected, errors, chunk = 0, 0, [], []
+        first = True
+        with instrumentation.measure(self.env, 'residue_import') as metric:
+            for row_number, row in self._iter_file_rows():
+                row = list(row or ())
+                if not any(self._cell_text(cell) for cell in row):
+                    continue
+                if first:
+                    first = False
+                    if self._is_residue_header_row(row):
+                        continue
+
+                vals, error = self._parse_residue_row(row, maps)
+                if error:
+                    rejected += 1
+                    errors.append(_('Fila %(row)s: %(error)s', row=row_number, error=error))
+                    continue
+                vals['order_id'] = self.order_id.id
+                chunk.append((row_number, vals))
+
+                if len(chunk) >= self._IMPORT_CHUNK_SIZE:
+                    created = self._create_line_chunk(chunk, errors)
+                    imported += created
+                    rejected += len(chunk) - created
+                    chunk = []
+            if chunk:
+                created = self._create_line_chunk(chunk, errors)
+                imported += created
+                rejected += len(chunk) - created
+            metric['created'] += imported
+
+        self.write({
+            'state': 'done',
+            'file': False,
+            'imported_count': imported,
+            'error_count': rejected,
+            'result_message': '\n'.join(errors) or False,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+            'name': _('Importar residuos'),
+        }
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, _
+
+from ..models.product_template import normalize_residue_name
+
+# Orden de columnas de una fila de residuo (pegada o importada)
+RESIDUE_ROW_COLUMNS = (
+    'name',
+    'residue_type',
+    'plan_manejo',
+    'capacity',
+    'weight_kg',
+    'volume',
+    'packaging',
+)
+
+# Primeras celdas que identifican una fila de encabezado
+_HEADER_NAMES = {'nombre', 'nombre del residuo', 'residuo', 'name'}
+
+
+class SaleResidueRowMixin(models.AbstractModel):
+    _name = 'sale.residue.row.mixin'
+    _description = 'Interpretación de filas de residuos'
+
+    # -------------------------------------------------------------------------
+    # HELPERS
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_residue_selection_maps(self):
+        """
+        {campo: {valor o etiqueta normalizada: valor}} para residue_type y
+        plan_manejo. Se calcula una vez por importación, no por fila.
+        """
+        Line = self.env['sale.order.line']
+        maps = {}
+        for fname in ('residue_type', 'plan_manejo'):
+            mapping = {}
+            for value, label in Line._fields[fname]._description_selection(self.env):
+                mapping[normalize_residue_name(value)] = value
+                mapping[normalize_residue_name(value.replace('_', ' '))] = value
+                mapping[normalize_residue_name(label)] = value
+            maps[fname] = mapping
+        return maps
+
+    @api.model
+    def _cell_text(self, cell):
+        if cell is None or cell is False:
+            return ''
+        if isinstance(cell, float) and cell.is_integer():
+            cell = int(cell)
+        return str(cell).strip()
+
+    @api.model
+    def _cell_float(self, cell, default):
+        """Número de una celda; acepta coma decimal. None si no es número."""
+        if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+            return float(cell)
+        text = self._cell_text(cell)
+        if not text:
+            return default
+        try:
+            return float(text.replace(' ', '').replace(',', '.'))
+        except ValueError:
+            return None
+
+    @api.model
+    def _is_residue_header_row(self, row):
+        return bool(row) and normalize_residue_name(self._cell_text(row[0])) in _HEADER_NAMES
+
+    @api.model
+    def _parse_residue_row(self, row, maps):
+        """
+        Valores de sale.order.line (sin order_id) a partir de una fila con las
+        columnas de RESIDUE_ROW_COLUMNS. Devuelve (vals, error); con error, vals es None.
+        El producto de servicio y el embalaje se resuelven por lotes en create().
+        """
+        cells = list(row) + [None] * (len(RESIDUE_ROW_COLUMNS) - len(row))
+        cell = dict(zip(RESIDUE_ROW_COLUMNS, cells))
+
+        name = self._cell_text(cell['name'])
+        if not name:
+            return None, _('falta el nombre del residuo')
+
+        selections = {}
+        for fname in ('residue_type', 'plan_manejo'):
+            text = self._cell_text(cell[fname])
+            value = maps[fname].get(normalize_residue_name(text)) if text else False
+            if value is None:
+                return None, _('valor no válido para %(field)s: "%(value)s"', field=fname, value=text)
+            selections[fname] = value
+
+        weight = self._cell_float(cell['weight_kg'], 0.0)
+        if weight is None or weight < 0:
+            return None, _('peso no válido: "%s"', self._cell_text(cell['weight_kg']))
+        volume = self._cell_float(cell['volume'], 1.0)
+        if volume is None or volume <= 0:
+            return None, _('unidades no válidas: "%s"', self._cell_text(cell['volume']))
+
+        vals = {
+            'create_new_service': True,
+            'residue_name': name,
+            'name': name,
+            'residue_type': selections['residue_type'],
+            'plan_manejo': selections['plan_manejo'],
+            'residue_capacity': self._cell_text(cell['capacity']) or False,
+            'residue_weight_kg': weight,
+            'residue_volume': volume,
+            'product_uom_qty': volume,
+        }
+        packaging = self._cell_text(cell['packaging'])
+        if packaging:
+            vals['create_new_packaging'] = True
+            vals['packaging_name'] = packaging
+        return vals, None